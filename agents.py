@@ -1,7 +1,23 @@
 import random
 import math
+import sys
 import time
 
+import config
+import evaluation
+import symmetry
+from sharedtt import SharedTranspositionTable
+from state import State
+from stats import SearchStats
+from util import popcount
+
+# transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchAborted(Exception):
+    pass
+
 
 class Agent:
     ident = 0
@@ -9,25 +25,193 @@ class Agent:
     def __init__(self):
         self.id = Agent.ident
         Agent.ident += 1
-
-    def get_chosen_action(self, state, max_depth):
+        self.name = type(self).__name__
+        self.stats = SearchStats()
+        self.transposition_table = {}
+        self.ponderer = None
+        # selective search of the two-player searchers, set per agent
+        self.late_move_reductions = config.LATE_MOVE_REDUCTIONS
+        self.futility_pruning = config.FUTILITY_PRUNING
+        self.stay_reduction = config.STAY_REDUCTION
+        self.weights = None  # evaluation weights, None uses the weights file
+        # value of the last searched position for every spaceship, for the searches that compute one
+        self.root_values = None
+
+    def choose(self, state, max_depth, deadline=None):
+        self.stats.reset()
+        self.stats.nodes = 1
+        self.root_values = None
+        self.stats.depth = min(max_depth, state.get_plies_left())
+        # a shared table has a fixed size and replaces its entries itself
+        if isinstance(self.transposition_table, dict) and len(self.transposition_table) > config.TT_MAX_ENTRIES:
+            self.transposition_table.clear()
+        start_time = time.perf_counter()
+        pondered = self.ponderer.take(state, max_depth, deadline) if self.ponderer else None
+        if pondered:
+            action, entries, depth = pondered
+            self.merge_transposition_table(entries)
+        # a search stopped before its first iteration finished has no move, it is searched again here
+        if pondered and depth:
+            self.stats.ponder_hit = True
+            self.stats.depth = depth
+        else:
+            action = self.get_chosen_action(state, max_depth, deadline)
+        self.stats.total_time = time.perf_counter() - start_time
+        return action
+
+    def new_game(self):
+        # entries of a shared table stay valid for the next game on the same map
+        if isinstance(self.transposition_table, dict):
+            self.transposition_table.clear()
+        self.stats.reset()
+
+    def attach_shared_table(self, name):
+        self.transposition_table = SharedTranspositionTable.attach(name)
+
+    def get_shared_table_name(self):
+        if isinstance(self.transposition_table, SharedTranspositionTable):
+            return self.transposition_table.get_name()
+        return None
+
+    def close(self):
+        if self.ponderer:
+            self.ponderer.close()
+        if isinstance(self.transposition_table, SharedTranspositionTable) and not self.transposition_table.owner:
+            self.transposition_table.close()
+
+    def merge_transposition_table(self, entries):
+        table = self.transposition_table
+        for key, entry in entries.items():
+            if key not in table or table[key][0] <= entry[0]:
+                table[key] = entry
+
+    def get_chosen_action(self, state, max_depth, deadline=None):
         pass
 
+    def deepen(self, state, max_depth, deadline, search):
+        # search(depth, first_move) returns the best move at that depth; without a time limit it runs once at
+        # max_depth, with one the depths are searched in turn until the soft deadline, each starting with the
+        # previous best move, and an iteration stopped at the hard deadline (SearchAborted) is dropped
+        if deadline is None or deadline.hard is None:
+            return search(max(1, max_depth), None)
+        best_move = self.ordered_actions(state)[0]
+        self.stats.depth = 0
+        for depth in range(1, max_depth + 1):
+            # an iteration started after the soft deadline would rarely finish, the first one always runs
+            if depth > 1 and deadline.soft_expired():
+                break
+            try:
+                best_move = search(depth, best_move if depth > 1 else None)
+            except SearchAborted:
+                break
+            self.stats.depth = min(depth, state.get_plies_left())
+            if depth >= state.get_plies_left():
+                break
+        return best_move
+
+    def get_table_key(self, node):
+        # symmetric positions share one entry, moves are stored in the frame of the canonical position
+        if config.TT_SYMMETRY:
+            return symmetry.canonical_key(node)
+        return node.get_key(), symmetry.IDENTITY
+
+    def legal_actions(self, node):
+        start_time = time.perf_counter()
+        actions = node.get_legal_actions()
+        self.stats.movegen_time += time.perf_counter() - start_time
+        return actions
+
+    def ordered_actions(self, node):
+        # long slides paint the most tiles and come first, staying comes last
+        return sorted(self.legal_actions(node), key=State.get_action_cost, reverse=True)
+
+    def get_reduction(self, move, index, depth_left):
+        # plies taken off a late or stay move, which is searched again in full if it raises alpha
+        if depth_left < config.LMR_MIN_DEPTH:
+            return 0
+        if self.stay_reduction and move[0] == move[1]:
+            return config.LMR_REDUCTION
+        if self.late_move_reductions and index >= config.LMR_FULL_MOVES:
+            return config.LMR_REDUCTION
+        return 0
+
+    def get_futility_bound(self, node):
+        # (value, per tile) with value + per tile * length bounding what a move of that length can lift the value
+        # of the side on move to at the frontier: it paints at most its length, each tile possibly taken from the
+        # opponent, and the region adds at most the tiles not in the mover's colour; None for weights without one
+        tiles_weight, region_weight, mobility_weight = self.weights or evaluation.WEIGHTS
+        if tiles_weight != 1 or not 0 <= region_weight <= 1 or mobility_weight < 0:
+            return None
+        tiles = config.M * config.N - popcount(node.abyss_tiles_positions_int)
+        scores = node.get_scores()
+        own = scores.pop(node.get_on_move_chr())
+        other = max(scores.values())
+        value = (1 - region_weight) * own - other + region_weight * tiles + mobility_weight * evaluation.MAX_MOBILITY
+        return value, 2 - region_weight
+
+    def successor(self, node, action):
+        start_time = time.perf_counter()
+        succ = node.generate_successor_state(action)
+        self.stats.successor_time += time.perf_counter() - start_time
+        self.stats.nodes += 1
+        return succ
+
+    def successors(self, node, actions=None):
+        # (move, successor) pairs built as the search reaches them, a cutoff leaves the rest unbuilt
+        children = node.iter_expand(self.legal_actions(node) if actions is None else actions)
+        while True:
+            start_time = time.perf_counter()
+            child = next(children, None)
+            self.stats.successor_time += time.perf_counter() - start_time
+            if child is None:
+                return
+            self.stats.nodes += 1
+            yield child
+
+    def evaluate(self, node, agent_char, opponent_char):
+        start_time = time.perf_counter()
+        value = evaluation.evaluate(node, agent_char, opponent_char, self.weights)
+        self.stats.evaluation_time += time.perf_counter() - start_time
+        self.stats.leaves += 1
+        return value
+
+    def evaluate_vector(self, node):
+        start_time = time.perf_counter()
+        value = evaluation.evaluate_vector(node, self.weights)
+        self.stats.evaluation_time += time.perf_counter() - start_time
+        self.stats.leaves += 1
+        return value
+
+
+def move_first(moves, move):
+    if move not in moves:
+        return moves
+    return [move] + [other for other in moves if other != move]
+
+
+def get_seat_names(algorithms_names, num_of_players):
+    if len(algorithms_names) >= num_of_players:
+        return algorithms_names[:num_of_players]
+    return algorithms_names + [algorithms_names[-1]] * (num_of_players - len(algorithms_names))
+
+
+def create_agents(algorithms_names, num_of_players):
+    module_agents = sys.modules[__name__]
+    return [getattr(module_agents, algo_name)() for algo_name in get_seat_names(algorithms_names, num_of_players)]
+
 
 class RandomAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
-        time.sleep(0.5)
-        actions = state.get_legal_actions()
+    def get_chosen_action(self, state, max_depth, deadline=None):
+        self.stats.depth = 0
+        actions = self.legal_actions(state)
         return actions[random.randint(0, len(actions) - 1)]
 
 
 class GreedyAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
-        time.sleep(0.5)
-        actions = state.get_legal_actions()
+    def get_chosen_action(self, state, max_depth, deadline=None):
+        self.stats.depth = min(1, state.get_plies_left())
         best_score, best_action = None, None
-        for action in actions:
-            new_state = state.generate_successor_state(action)
+        for action, new_state in self.successors(state):
             score = new_state.get_score(state.get_on_move_chr())
             if (best_score is None and best_action is None) or score > best_score:
                 best_action = action
@@ -36,8 +220,7 @@ class GreedyAgent(Agent):
 
 
 class MinimaxAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
-        time.sleep(0.5)
+    def get_chosen_action(self, state, max_depth, deadline=None):
         if state.get_num_of_players() != 2:
             raise ValueError("MinimaxAgent supports exactly 2 players")
 
@@ -49,7 +232,7 @@ class MinimaxAgent(Agent):
             return node.is_goal_state() or depth_left == 0
 
         def evaluate(node):
-            return node.get_score(max_player_char) - node.get_score(opponent_char)
+            return self.evaluate(node, max_player_char, opponent_char)
 
         def minimax(node, maximizing_player, depth_left):
             if is_terminal(node, depth_left):
@@ -57,16 +240,14 @@ class MinimaxAgent(Agent):
 
             if maximizing_player:
                 best = -math.inf
-                for move in node.get_legal_actions():
-                    succ = node.generate_successor_state(move)
+                for move, succ in self.successors(node):
                     val = minimax(succ, False, depth_left - 1)
                     if val > best:
                         best = val
                 return best
             else:
                 best = math.inf
-                for move in node.get_legal_actions():
-                    succ = node.generate_successor_state(move)
+                for move, succ in self.successors(node):
                     val = minimax(succ, True, depth_left - 1)
                     if val < best:
                         best = val
@@ -74,8 +255,7 @@ class MinimaxAgent(Agent):
 
         best_move = None
         best_value = -math.inf
-        for move in state.get_legal_actions():
-            succ = state.generate_successor_state(move)
+        for move, succ in self.successors(state):
             val = minimax(succ, False, max_depth - 1)
             if val > best_value:
                 best_value = val
@@ -85,8 +265,7 @@ class MinimaxAgent(Agent):
 
 
 class MinimaxABAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
-        time.sleep(0.5)
+    def get_chosen_action(self, state, max_depth, deadline=None):
         if state.get_num_of_players() != 2:
             raise ValueError("MinimaxABAgent supports exactly 2 players")
 
@@ -98,83 +277,147 @@ class MinimaxABAgent(Agent):
             return node.is_goal_state() or depth_left == 0
 
         def evaluate(node):
-            return node.get_score(agent_char) - node.get_score(opponent_char)
+            return self.evaluate(node, agent_char, opponent_char)
 
         def alphabeta(node, maximizing_player, depth_left, alpha, beta):
+            if deadline and deadline.hard_expired():
+                raise SearchAborted()
             if is_terminal(node, depth_left):
                 return evaluate(node)
 
             if maximizing_player:
                 value = -math.inf
-                for move in node.get_legal_actions():
-                    succ = node.generate_successor_state(move)
+                for move, succ in self.successors(node):
                     value = max(value, alphabeta(succ, False, depth_left - 1, alpha, beta))
                     alpha = max(alpha, value)
                     if alpha >= beta:
+                        self.stats.cutoffs += 1
                         break
                 return value
             else:
                 value = math.inf
-                for move in node.get_legal_actions():
-                    succ = node.generate_successor_state(move)
+                for move, succ in self.successors(node):
                     value = min(value, alphabeta(succ, True, depth_left - 1, alpha, beta))
                     beta = min(beta, value)
                     if beta <= alpha:
+                        self.stats.cutoffs += 1
                         break
                 return value
 
-        best_move = None
-        best_value = -math.inf
-        alpha = -math.inf
-        beta = math.inf
-        for move in state.get_legal_actions():
-            succ = state.generate_successor_state(move)
-            val = alphabeta(succ, False, max_depth - 1, alpha, beta)
-            if val > best_value:
-                best_value = val
-                best_move = move
-            alpha = max(alpha, best_value)
-            if alpha >= beta:
-                break
+        def search(depth, first_move):
+            best_move = None
+            best_value = -math.inf
+            alpha = -math.inf
+            beta = math.inf
+            for move, succ in self.successors(state, move_first(self.legal_actions(state), first_move)):
+                val = alphabeta(succ, False, depth - 1, alpha, beta)
+                if val > best_value:
+                    best_value = val
+                    best_move = move
+                alpha = max(alpha, best_value)
+                if alpha >= beta:
+                    break
+            return best_move
 
-        return best_move
+        return self.deepen(state, max_depth, deadline, search)
 
 
 class MaxNAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
-        time.sleep(0.5)
-        num_players = state.get_num_of_players()
-
-        def evaluate_as_tuple(s):
-            vals = []
-            for i in range(num_players):
-                ch = chr(ord('A') + i)
-                vals.append(s.get_score(ch))
-            return tuple(vals)
-
-        def maxn(node, depth_left):
-            if node.is_goal_state() or depth_left == 0:
-                return evaluate_as_tuple(node), None
-
-            current_player_ord = node.get_on_move_ord()
+    # every spaceship maximizes its own estimated score, or with shares its share of the estimated scores;
+    # the shares sum to 1, so the values of the spaceships above a node bound what the one on move there
+    # can still be given (shallow and speculative pruning, Sturtevant 2003)
+    def __init__(self):
+        super().__init__()
+        self.shares = config.MAXN_SHARES
+
+    def get_chosen_action(self, state, max_depth, deadline=None):
+        num_of_players = state.get_num_of_players()
+        shares = self.shares
+        speculate = shares and num_of_players > 2
+        # best move of every inner node of the previous iteration, searched first
+        best_moves = {}
+
+        def is_terminal(node, depth_left):
+            return node.is_goal_state() or depth_left == 0
+
+        def evaluate(node):
+            if not shares:
+                return self.evaluate_vector(node)
+            # tuned weights may push an estimate below zero, shares need non-negative ones
+            scores = [max(0, score) for score in self.evaluate_vector(node)]
+            total = sum(scores)
+            if not total:
+                return (1 / num_of_players,) * num_of_players
+            return tuple(score / total for score in scores)
+
+        def ordered_actions(node, depth_left):
+            actions = self.ordered_actions(node)
+            if depth_left > 1 and (move := best_moves.get(node.get_key())) in actions:
+                actions.remove(move)
+                actions.insert(0, move)
+            return actions
+
+        # parent_best is the value of the parent's spaceship at the parent so far, grandparent_best that
+        # of the grandparent's spaceship, None at the root or when it cannot be used;
+        # returns the vector, the move and whether the vector was cut speculatively
+        def maxn(node, depth_left, parent_best, grandparent_best):
+            if deadline and deadline.hard_expired():
+                raise SearchAborted()
+            if is_terminal(node, depth_left):
+                return evaluate(node), None, False
+
+            player = node.get_on_move_ord()
+            parent_player = (player - 1) % num_of_players
             best_vector = None
             best_move = None
-
-            for move in node.get_legal_actions():
-                succ = node.generate_successor_state(move)
-                vec, _ = maxn(succ, depth_left - 1)
-                if best_vector is None or vec[current_player_ord] > best_vector[current_player_ord]:
+            speculative = []
+            moves = ordered_actions(node, depth_left)
+            for i, (move, succ) in enumerate(self.successors(node, moves)):
+                best_value = best_vector[player] if best_vector else 0
+                # raw estimates have no sum to bound them, nothing is pruned
+                vec, _, cut = maxn(succ, depth_left - 1, best_value if shares else None,
+                                   parent_best if speculate else None)
+                if cut:
+                    # unknown until the parent knows whether it needs this node's exact value
+                    speculative.append((move, succ))
+                elif best_vector is None or vec[player] > best_value:
                     best_vector = vec
                     best_move = move
-
-            return best_vector, best_move
-
-        _, best_move = maxn(state, max_depth)
-        return best_move
+                if best_vector is None or parent_best is None or i == len(moves) - 1:
+                    continue
+                # the parent's spaceship can get at most 1 - best_vector[player] from here
+                if best_vector[player] + parent_best >= 1:
+                    self.stats.pruned += len(moves) - i - 1
+                    return best_vector, best_move, False
+                # whatever the parent picks from here gives the grandparent's spaceship
+                # no more than it already has, unless the parent picks another child
+                if grandparent_best is not None and best_vector[player] + parent_best + grandparent_best >= 1:
+                    self.stats.pruned += len(moves) - i - 1
+                    return best_vector, best_move, True
+
+            if speculative and (best_vector is None or best_vector[parent_player] > parent_best):
+                # the parent may pick this node, the cut children have to be searched after all
+                for move, succ in speculative:
+                    best_value = best_vector[player] if best_vector else 0
+                    vec, _, _ = maxn(succ, depth_left - 1, best_value, None)
+                    if best_vector is None or vec[player] > best_value:
+                        best_vector = vec
+                        best_move = move
+            if depth_left > 1:
+                best_moves[node.get_key()] = best_move
+            return best_vector, best_move, False
+
+        # best_moves puts the previous best move first
+        def search(depth, first_move):
+            vector, move, _ = maxn(state, depth, None, None)
+            self.root_values = {chr(ord('A') + i): share for i, share in enumerate(vector)}
+            return move
+
+        return self.deepen(state, max_depth, deadline, search)
 
 
 class NegamaxAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
+    def get_chosen_action(self, state, max_depth, deadline=None):
         if state.get_num_of_players() != 2:
             raise ValueError("NegamaxAgent supports exactly 2 players")
 
@@ -186,15 +429,14 @@ class NegamaxAgent(Agent):
             return node.is_goal_state() or depth_left == 0
 
         def evaluate(node):
-            return node.get_score(agent_char) - node.get_score(opponent_char)
+            return self.evaluate(node, agent_char, opponent_char)
 
         def negamax(node, depth_left, color):
             if is_terminal(node, depth_left):
                 return color * evaluate(node)
 
             best_value = -math.inf
-            for move in node.get_legal_actions():
-                succ = node.generate_successor_state(move)
+            for move, succ in self.successors(node):
                 val = -negamax(succ, depth_left - 1, -color)
                 if val > best_value:
                     best_value = val
@@ -202,8 +444,7 @@ class NegamaxAgent(Agent):
 
         best_move = None
         best_value = -math.inf
-        for move in state.get_legal_actions():
-            succ = state.generate_successor_state(move)
+        for move, succ in self.successors(state):
             val = -negamax(succ, max_depth - 1, -1)
             if val > best_value:
                 best_value = val
@@ -213,7 +454,7 @@ class NegamaxAgent(Agent):
 
 
 class NegamaxABAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
+    def get_chosen_action(self, state, max_depth, deadline=None):
         if state.get_num_of_players() != 2:
             raise ValueError("NegamaxABAgent supports exactly 2 players")
 
@@ -225,87 +466,238 @@ class NegamaxABAgent(Agent):
             return node.is_goal_state() or depth_left == 0
 
         def evaluate(node):
-            return node.get_score(agent_char) - node.get_score(opponent_char)
+            return self.evaluate(node, agent_char, opponent_char)
+
+        table = self.transposition_table
+        # kept aside, a shared table may lose the root entry to another process
+        root_move = [None]
 
+        # values are stored from the point of view of the player on move, so entries stay valid between moves
         def negamax(node, depth_left, alpha, beta, color):
+            if deadline and deadline.hard_expired():
+                raise SearchAborted()
             if is_terminal(node, depth_left):
                 return color * evaluate(node)
 
+            alpha_orig = alpha
+            key, transform = self.get_table_key(node)
+            moves = self.ordered_actions(node)
+            entry = table.get(key)
+            if entry is not None:
+                entry_depth, bound, value, entry_move = entry
+                entry_move = symmetry.transform_action(entry_move, symmetry.INVERSES[transform])
+                # a root entry that is not a legal move here is a collision of a lossy table
+                if entry_depth >= depth_left and (node is not state or entry_move in moves):
+                    self.stats.tt_hits += 1
+                    if node is state:
+                        root_move[0] = entry_move
+                    if bound == EXACT:
+                        return value
+                    if bound == LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if alpha >= beta:
+                        return value
+                if entry_move in moves:
+                    moves = [entry_move] + [move for move in moves if move != entry_move]
+
+            # at the frontier, moves that cannot lift the value above alpha are skipped
+            futility = self.get_futility_bound(node) if self.futility_pruning and depth_left == 1 and \
+                node is not state else None
             best_value = -math.inf
-            for move in node.get_legal_actions():
-                succ = node.generate_successor_state(move)
-                val = -negamax(succ, depth_left - 1, -beta, -alpha, -color)
+            best_move = None
+            for index, (move, succ) in enumerate(self.successors(node, moves)):
+                reduction = self.get_reduction(move, index, depth_left) if node is not state else 0
+                if reduction:
+                    val = -negamax(succ, depth_left - 1 - reduction, -alpha - 1, -alpha, -color)
+                if not reduction or val > alpha:
+                    val = -negamax(succ, depth_left - 1, -beta, -alpha, -color)
                 if val > best_value:
                     best_value = val
+                    best_move = move
                 alpha = max(alpha, val)
                 if alpha >= beta:
+                    self.stats.cutoffs += 1
                     break  # cutoff
+                # the moves after the first come longest first, once one cannot beat alpha none of the rest can
+                if futility and index + 1 < len(moves):
+                    futility_value = futility[0] + futility[1] * State.get_action_cost(moves[index + 1])
+                    if futility_value <= alpha:
+                        self.stats.pruned += len(moves) - index - 1
+                        best_value = max(best_value, futility_value)
+                        break
+
+            if best_value <= alpha_orig:
+                bound = UPPER
+            elif best_value >= beta:
+                bound = LOWER
+            else:
+                bound = EXACT
+            if entry is None or entry[0] <= depth_left:
+                table[key] = (depth_left, bound, best_value, symmetry.transform_action(best_move, transform))
+            if node is state:
+                root_move[0] = best_move
             return best_value
 
-        best_move = None
-        best_value = -math.inf
-        alpha = -math.inf
-        beta = math.inf
-        for move in state.get_legal_actions():
-            succ = state.generate_successor_state(move)
-            val = -negamax(succ, max_depth - 1, -beta, -alpha, -1)
-            if val > best_value:
-                best_value = val
-                best_move = move
-            alpha = max(alpha, best_value)
+        # the table orders the moves of every iteration, the previous best move included
+        def search(depth, first_move):
+            value = negamax(state, depth, -math.inf, math.inf, 1)
+            self.root_values = {agent_char: value, opponent_char: -value}
+            return root_move[0]
 
-        return best_move
+        return self.deepen(state, max_depth, deadline, search)
 
 
 class ExpectimaxAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
-        if state.get_num_of_players() != 2:
-            raise ValueError("ExpectimaxAgent supports exactly 2 players")
-
-        agent_char = state.get_on_move_chr()
-        players = [chr(ord('A') + i) for i in range(state.get_num_of_players())]
-        opponent_char = [p for p in players if p != agent_char][0]
+    # the spaceship on move maximizes, every other one is a chance node with uniformly random replies;
+    # chance nodes are pruned with Star1/Star2 (Ballard) using the bounds of the evaluation
+    def get_value_range(self, state, max_depth, agent_ord):
+        # bounds of the value (own estimate minus the best other one) at every leaf within max_depth plies:
+        # a ply paints at most max(M, N) - 1 new tiles, the region adds at most the tiles not in the ship's colour
+        # and mobility at most MAX_MOBILITY end tiles, final leaves have neither
+        tiles_weight, region_weight, mobility_weight = self.weights or evaluation.WEIGHTS
+        tiles = config.M * config.N - popcount(state.abyss_tiles_positions_int)
+        if tiles_weight != 1 or not 0 <= region_weight <= 1 or mobility_weight < 0:
+            return -math.inf, math.inf
+        num_of_players = state.get_num_of_players()
+        on_move_ord = state.get_on_move_ord()
+        plies = min(max_depth, state.get_plies_left())
+        if plies == state.get_plies_left():
+            # every leaf ends the game and is worth its real scores
+            region_weight = mobility_weight = 0
+        move_tiles = max(config.M, config.N) - 1
+        painted = [move_tiles * len(range((i - on_move_ord) % num_of_players, plies, num_of_players))
+                   for i in range(num_of_players)]
+        scores = [state.get_score(chr(ord('A') + i)) for i in range(num_of_players)]
+        most = [(1 - region_weight) * min(tiles, scores[i] + painted[i]) + region_weight * tiles +
+                mobility_weight * evaluation.MAX_MOBILITY for i in range(num_of_players)]
+        least = [scores[i] - (sum(painted) - painted[i]) for i in range(num_of_players)]
+        others = [i for i in range(num_of_players) if i != agent_ord]
+        return (least[agent_ord] - max(most[i] for i in others),
+                most[agent_ord] - max(least[i] for i in others))
+
+    def get_chosen_action(self, state, max_depth, deadline=None):
+        agent_ord = state.get_on_move_ord()
+        num_of_players = state.get_num_of_players()
+        # a narrower range than the sound one prunes more, evaluations outside it are clipped
+        bound = config.EXPECTIMAX_BOUND * (config.M * config.N - popcount(state.abyss_tiles_positions_int))
+        low, high = -bound, bound
+        samples = config.EXPECTIMAX_SAMPLES
+        # a node keeps its sample for the whole move, so bounds from probing hold when it is searched again
+        sample_seed = random.getrandbits(32)
 
         def is_terminal(node, depth_left):
             return node.is_goal_state() or depth_left == 0
 
         def evaluate(node):
-            return node.get_score(agent_char) - node.get_score(opponent_char)
+            scores = self.evaluate_vector(node)
+            value = scores[agent_ord] - max(score for i, score in enumerate(scores) if i != agent_ord)
+            return min(max(value, low), high)
 
-        def expectimax(node, depth_left, maximizing_player):
+        def expectimax(node, depth_left, alpha, beta):
+            if deadline and deadline.hard_expired():
+                raise SearchAborted()
             if is_terminal(node, depth_left):
                 return evaluate(node)
-
-            actions = node.get_legal_actions()
-            if maximizing_player:
-                best = -math.inf
-                for move in actions:
-                    succ = node.generate_successor_state(move)
-                    val = expectimax(succ, depth_left - 1, False)
+            if node.get_on_move_ord() != agent_ord:
+                return chance(node, depth_left, alpha, beta)
+            return maximize(node, depth_left, alpha, beta)
+
+        def maximize(node, depth_left, alpha, beta, probed_value=None):
+            # probed_value is the value of the first ordered move, already searched by a probe
+            if deadline and deadline.hard_expired():
+                raise SearchAborted()
+            if is_terminal(node, depth_left):
+                return evaluate(node) if probed_value is None else probed_value
+            moves = self.ordered_actions(node)
+            best = -math.inf
+            if probed_value is not None:
+                best = probed_value
+                moves = moves[1:]
+            if best < beta:
+                for _, succ in self.successors(node, moves):
+                    val = expectimax(succ, depth_left - 1, max(alpha, best), beta)
                     if val > best:
                         best = val
-                return best
-            else:
-                total = 0
-                for move in actions:
-                    succ = node.generate_successor_state(move)
-                    total += expectimax(succ, depth_left - 1, True)
-                return total / len(actions) if actions else 0
+                    if best >= beta:
+                        break
+            if best >= beta:
+                self.stats.cutoffs += 1
+            return best
 
-        best_move = None
-        best_value = -math.inf
-        for move in state.get_legal_actions():
-            succ = state.generate_successor_state(move)
-            val = expectimax(succ, max_depth - 1, False)
-            if val > best_value:
-                best_value = val
-                best_move = move
+        def probe(node, depth_left, beta):
+            # the value of the first ordered move is a lower bound of a max node,
+            # exact below beta since the probe window starts at the lowest value
+            if is_terminal(node, depth_left):
+                return evaluate(node)
+            move = self.ordered_actions(node)[0]
+            return expectimax(self.successor(node, move), depth_left - 1, low, beta)
+
+        def chance(node, depth_left, alpha, beta):
+            actions = self.legal_actions(node)
+            if samples and len(actions) > samples:
+                actions = random.Random(hash(node.get_key()) ^ sample_seed).sample(actions, samples)
+            count = len(actions)
+            # fewer plies left below the node narrow the range of its children
+            node_low, node_high = self.get_value_range(node, depth_left, agent_ord)
+            node_low, node_high = min(max(node_low, low), high), max(min(node_high, high), low)
+            # bounds of every child, the node is their average
+            lower = [node_low] * count
+            lower_sum, upper_sum = node_low * count, node_high * count
+            # children in order are built as they are searched, a cutoff leaves the rest unbuilt
+            order = enumerate(succ for _, succ in self.successors(node, actions))
+
+            probing = config.EXPECTIMAX_PROBING and (node.get_on_move_ord() + 1) % num_of_players == agent_ord
+            if probing:
+                successors = [succ for _, succ in order]
+                for i, succ in enumerate(successors):
+                    child_beta = count * beta - (lower_sum - node_low)
+                    lower[i] = probe(succ, depth_left - 1, min(child_beta, node_high))
+                    lower_sum += lower[i] - node_low
+                    if lower[i] >= child_beta:
+                        self.stats.cutoffs += 1
+                        return lower_sum / count
+                # children with the lowest bounds first, they bring the upper bound down fastest
+                order = sorted(enumerate(successors), key=lambda child: lower[child[0]])
+
+            for i, succ in order:
+                child_alpha = count * alpha - (upper_sum - node_high)
+                child_beta = count * beta - (lower_sum - lower[i])
+                window = max(child_alpha, lower[i]), min(child_beta, node_high)
+                if probing:
+                    val = maximize(succ, depth_left - 1, *window, lower[i])
+                else:
+                    val = expectimax(succ, depth_left - 1, *window)
+                upper_sum += val - node_high
+                if val <= child_alpha:
+                    self.stats.cutoffs += 1
+                    return upper_sum / count
+                lower_sum += val - lower[i]
+                if val >= child_beta:
+                    self.stats.cutoffs += 1
+                    return lower_sum / count
+            return lower_sum / count
+
+        def search(depth, first_move):
+            # the range of every iteration, final leaves are only sound to bound when the game ends within it
+            nonlocal low, high
+            depth_low, depth_high = self.get_value_range(state, depth, agent_ord)
+            low, high = max(depth_low, -bound), min(depth_high, bound)
+            best_move = None
+            best_value = -math.inf
+            for move, succ in self.successors(state, move_first(self.ordered_actions(state), first_move)):
+                val = expectimax(succ, depth - 1, max(best_value, low), high)
+                if val > best_value:
+                    best_value = val
+                    best_move = move
+            return best_move
 
-        return best_move
+        return self.deepen(state, max_depth, deadline, search)
 
 
 class NegascoutAgent(Agent):
-    def get_chosen_action(self, state, max_depth):
+    def get_chosen_action(self, state, max_depth, deadline=None):
         if state.get_num_of_players() != 2:
             raise ValueError("NegaScoutAgent supports exactly 2 players")
 
@@ -317,21 +709,28 @@ class NegascoutAgent(Agent):
             return node.is_goal_state() or depth_left == 0
 
         def evaluate(node):
-            return node.get_score(agent_char) - node.get_score(opponent_char)
+            return self.evaluate(node, agent_char, opponent_char)
 
         def negascout(node, depth_left, alpha, beta, color):
+            if deadline and deadline.hard_expired():
+                raise SearchAborted()
             if is_terminal(node, depth_left):
                 return color * evaluate(node)
 
             b = beta
             best_value = -math.inf
             first_child = True
-            for move in node.get_legal_actions():
-                succ = node.generate_successor_state(move)
+            # at the frontier, moves that cannot lift the value above alpha are skipped
+            futility = self.get_futility_bound(node) if self.futility_pruning and depth_left == 1 else None
+            moves = self.ordered_actions(node)
+            for index, (move, succ) in enumerate(self.successors(node, moves)):
                 if first_child:
                     val = -negascout(succ, depth_left - 1, -b, -alpha, -color)
                 else:
-                    val = -negascout(succ, depth_left - 1, -alpha - 1, -alpha, -color)
+                    reduction = self.get_reduction(move, index, depth_left)
+                    val = -negascout(succ, depth_left - 1 - reduction, -alpha - 1, -alpha, -color)
+                    if reduction and val > alpha:
+                        val = -negascout(succ, depth_left - 1, -alpha - 1, -alpha, -color)
                     if val > alpha and val < beta:
                         val = -negascout(succ, depth_left - 1, -b, -alpha, -color)
                 if val > best_value:
@@ -339,29 +738,38 @@ class NegascoutAgent(Agent):
                 if best_value > alpha:
                     alpha = best_value
                 if alpha >= beta:
+                    self.stats.cutoffs += 1
                     break
+                # the moves after the first come longest first, once one cannot beat alpha none of the rest can
+                if futility and index + 1 < len(moves):
+                    futility_value = futility[0] + futility[1] * State.get_action_cost(moves[index + 1])
+                    if futility_value <= alpha:
+                        self.stats.pruned += len(moves) - index - 1
+                        best_value = max(best_value, futility_value)
+                        break
                 b = alpha + 1
                 first_child = False
             return best_value
 
-        best_move = None
-        best_value = -math.inf
-        alpha = -math.inf
-        beta = math.inf
-        for move in state.get_legal_actions():
-            succ = state.generate_successor_state(move)
-            val = -negascout(succ, max_depth - 1, -beta, -alpha, -1)
-            if val > best_value:
-                best_value = val
-                best_move = move
-            if best_value > alpha:
-                alpha = best_value
+        def search(depth, first_move):
+            best_move = None
+            best_value = -math.inf
+            alpha = -math.inf
+            beta = math.inf
+            for move, succ in self.successors(state, move_first(self.ordered_actions(state), first_move)):
+                val = -negascout(succ, depth - 1, -beta, -alpha, -1)
+                if val > best_value:
+                    best_value = val
+                    best_move = move
+                if best_value > alpha:
+                    alpha = best_value
+            return best_move
 
-        return best_move
+        return self.deepen(state, max_depth, deadline, search)
 
 
 class MinimaxID(Agent):
-    def get_chosen_action(self, state, max_depth, time_limit=None):
+    def get_chosen_action(self, state, max_depth, deadline=None):
         agent_char = state.get_on_move_chr()
         players = [chr(ord('A') + i) for i in range(state.get_num_of_players())]
         opponent_char = [p for p in players if p != agent_char][0]
@@ -370,44 +778,48 @@ class MinimaxID(Agent):
             return node.is_goal_state() or depth == 0
 
         def evaluate(node):
-            return node.get_score(agent_char) - node.get_score(opponent_char)
+            return self.evaluate(node, agent_char, opponent_char)
 
         def minimax(node, depth, maximizing_player):
+            if deadline and deadline.hard_expired():
+                raise SearchAborted()
             if is_terminal(node, depth):
                 return evaluate(node)
 
-            actions = node.get_legal_actions()
+            actions = self.legal_actions(node)
             if maximizing_player:
                 best_val = -math.inf
-                for move in actions:
-                    succ = node.generate_successor_state(move)
+                for move, succ in self.successors(node, actions):
                     val = minimax(succ, depth - 1, False)
                     best_val = max(best_val, val)
                 return best_val
             else:
                 best_val = math.inf
-                for move in actions:
-                    succ = node.generate_successor_state(move)
+                for move, succ in self.successors(node, actions):
                     val = minimax(succ, depth - 1, True)
                     best_val = min(best_val, val)
                 return best_val
 
-        best_move = None
-        start_time = time.time()
+        best_move = self.legal_actions(state)[0]
+        self.stats.depth = 0
 
         for depth in range(1, max_depth + 1):
-            if time_limit and (time.time() - start_time) >= time_limit:
+            # an iteration started after the soft deadline would rarely finish
+            if deadline and deadline.soft_expired():
                 break
 
             current_best_move = None
             best_value = -math.inf
-            for move in state.get_legal_actions():
-                succ = state.generate_successor_state(move)
-                val = minimax(succ, depth - 1, False)
-                if val > best_value:
-                    best_value = val
-                    current_best_move = move
+            try:
+                for move, succ in self.successors(state):
+                    val = minimax(succ, depth - 1, False)
+                    if val > best_value:
+                        best_value = val
+                        current_best_move = move
+            except SearchAborted:
+                break
 
             best_move = current_best_move
+            self.stats.depth = min(depth, state.get_plies_left())
 
         return best_move
@@ -0,0 +1,300 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import config
+from map_loader import parse_map
+from match import create_variant
+from state import MapDescriptor, pack_states, unpack_states
+from util import popcount
+
+# lines of the text logs, read without the level in front
+AGENTS_LINE = re.compile(r'Agents: (.*)')
+ROUND_LINE = re.compile(r'Round (\d+) / (\d+)$')
+BOARD_LINE = re.compile(r'[0_a-dA-D]( [0_a-dA-D])*$')
+CHOSEN_LINE = re.compile(r'agent ([A-D]) chose action \(\((\d+), (\d+)\), \((\d+), (\d+)\)\)(?:.*?depth (\d+),)?')
+DIFF_LINE = re.compile(r'Round \d+ / \d+: ([A-D]) \((\d+), (\d+)\) -> \((\d+), (\d+)\)')
+LEVEL_PREFIXES = ('INFO: ', 'ERROR: ')
+FIELDS = ['file', 'game', 'ply', 'round', 'seat', 'agent', 'played', 'best', 'played_value', 'best_value', 'loss',
+          'mark', 'played_depth', 'depth']
+SUMMARY_FIELDS = ['agent', 'moves', 'best_moves', 'accuracy', 'mean_loss', 'mistakes', 'blunders']
+
+
+def read_log(path):
+    # (game, ply, state, action, agent, played depth) of every move; a board after 'In state' sets the
+    # position (before every move in old logs, at the start of the game in newer ones) and moves advance it
+    agents = {}
+    game = ply = 0
+    state = None
+    on_move_unknown = False
+    board = None
+    current_round = max_rounds = 0
+    skip_diff = False
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.rstrip('\n')
+            if line.startswith(LEVEL_PREFIXES):
+                line = line.split(': ', 1)[1]
+            if board is not None:
+                if BOARD_LINE.match(line):
+                    board.append(line.replace(' ', ''))
+                    continue
+                state = parse_map(board, max_rounds, path)
+                state.current_round = current_round
+                # a board does not show who is on move, the next move does
+                on_move_unknown = True
+                board = None
+
+            if match := AGENTS_LINE.match(line):
+                agents = dict(seat.split(' ', 1) for seat in match.group(1).split(', '))
+                if ply:
+                    game, ply = game + 1, 0
+                continue
+            if match := ROUND_LINE.match(line):
+                current_round, max_rounds = int(match.group(1)) - 1, int(match.group(2))
+                continue
+            if line == 'In state':
+                board = []
+                continue
+            # the headless game logs a move twice, as the agent's choice and as its diff
+            if match := CHOSEN_LINE.match(line):
+                skip_diff = True
+                played_depth = int(match.group(6)) if match.group(6) else None
+            elif match := DIFF_LINE.match(line):
+                if skip_diff:
+                    skip_diff = False
+                    continue
+                played_depth = None
+            else:
+                continue
+            if state is None:
+                continue
+            mover = match.group(1)
+            action = (int(match.group(2)), int(match.group(3))), (int(match.group(4)), int(match.group(5)))
+            if on_move_unknown:
+                state.on_move = ord(mover) - ord('A')
+                on_move_unknown = False
+            elif state.get_on_move_chr() != mover:
+                raise ValueError(f'{mover} moved but {state.get_on_move_chr()} was on move')
+            # checked before the position is handed out, an illegal move ends the file
+            next_state = state.generate_successor_state(action)
+            yield game, ply, state, action, agents.get(mover, mover), played_depth
+            state = next_state
+            ply += 1
+
+
+def read_record(path):
+    # the map and the moves of a game written with --record
+    with open(path, 'r') as file:
+        header = json.loads(next(file))
+        state = parse_map(header['map'], header['max_rounds'], path)
+        state.current_round, state.on_move = header['round'], header['on_move']
+        agents = header.get('agents', [])
+        for ply, line in enumerate(file):
+            move = json.loads(line)
+            mover_ord = ord(move['mover']) - ord('A')
+            action = tuple(move['from']), tuple(move['to'])
+            next_state = state.generate_successor_state(action)
+            yield 0, ply, state, action, agents[mover_ord] if agents else move['mover'], None
+            state = next_state
+
+
+# readers by the prefix of the file name, a new log format only needs its reader here
+READERS = {'LOG': read_log, 'SIMULATION': read_log, 'RECORD': read_record}
+
+
+def get_reader(path):
+    return READERS.get(os.path.basename(path).split('_')[0])
+
+
+def get_paths(paths):
+    # only the names of a folder are listed up front, every file is read when its turn comes
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if get_reader(name):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def get_chunks(paths, chunk_size):
+    # consecutive positions of one game, the unit of work of the pool
+    for path in get_paths(paths):
+        reader = get_reader(path)
+        if reader is None:
+            print(f'{path}: unknown log format, skipped')
+            continue
+        chunk = []
+        try:
+            for game, ply, state, action, agent, played_depth in reader(path):
+                if chunk and chunk[-1][1] != game:
+                    yield chunk
+                    chunk = []
+                chunk.append((os.path.basename(path), game, ply, state, action, agent, played_depth))
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+        except Exception as e:
+            print(f'{path}: {e}, the rest of the file is skipped')
+        if chunk:
+            yield chunk
+
+
+def search(agent, state, depth):
+    # a fresh table for every root, bounds stored for another root could stand in for exact values
+    agent.new_game()
+    action = agent.choose(state, depth)
+    return action, agent.root_values
+
+
+def get_final_value(state, mover, scale):
+    # the game is over, the real scores instead of a search (margin for two ships, share for more)
+    scores = state.get_scores()
+    if len(scores) == 2:
+        return 2 * scores[mover] - sum(scores.values())
+    return scores[mover] / sum(scores.values()) * scale
+
+
+def analyze_positions(descriptor_data, states_data, actions, depths):
+    # in the pool: the best move of every position at its depth and the values of the best and the played move
+    descriptor = MapDescriptor.from_bytes(descriptor_data).register()
+    states = unpack_states(states_data, descriptor)
+    if len(descriptor.spaceship_kinds) == 2:
+        agent, scale = create_variant('NegamaxABAgent', []), 1
+    else:
+        # shares of the estimated scores, in tiles of the map
+        agent = create_variant('MaxNAgent', [])
+        agent.shares = True
+        scale = descriptor.m * descriptor.n - popcount(descriptor.abyss_tiles_positions_int)
+    results = []
+    for state, action, depth in zip(states, actions, depths):
+        mover = state.get_on_move_chr()
+        best_action, values = search(agent, state, depth)
+        best_value = values[mover] * scale
+        next_state = state.generate_successor_state(action)
+        if action == best_action:
+            played_value = best_value
+        elif next_state.is_goal_state():
+            played_value = get_final_value(next_state, mover, scale)
+        else:
+            _, values = search(agent, next_state, depth - 1)
+            played_value = values[mover] * scale
+        results.append((best_action, best_value, played_value))
+    return results
+
+
+def get_mark(loss):
+    if loss >= config.BLUNDER_LOSS:
+        return '??'
+    if loss >= config.MISTAKE_LOSS:
+        return '?'
+    return ''
+
+
+def get_rows(chunk, depths, future):
+    try:
+        results = future.result()
+    except Exception as e:
+        file, game, ply = chunk[0][:3]
+        print(f'{file}: {e!r}, {len(chunk)} positions of game {game} from ply {ply} are skipped')
+        return
+    for (file, game, ply, state, action, agent, played_depth), depth, (best_action, best_value, played_value) in \
+            zip(chunk, depths, results):
+        loss = max(0.0, best_value - played_value)
+        yield {'file': file, 'game': game, 'ply': ply, 'round': state.get_current_round() + 1,
+               'seat': state.get_on_move_chr(), 'agent': agent, 'played': action, 'best': best_action,
+               'played_value': round(played_value, 3), 'best_value': round(best_value, 3), 'loss': round(loss, 3),
+               'mark': get_mark(loss), 'played_depth': played_depth, 'depth': depth}
+
+
+def analyze(paths, depth, workers, chunk_size):
+    # rows in the order of the logs; only a few chunks per worker are read ahead
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in get_chunks(paths, chunk_size):
+            states = [position[3] for position in chunk]
+            descriptor = states[0].get_descriptor()
+            # deeper than the game itself was played where the log tells
+            depths = [max(depth, (position[6] or 0) + 1) for position in chunk]
+            future = executor.submit(analyze_positions, descriptor.to_bytes(), bytes(pack_states(states, descriptor)),
+                                     [position[4] for position in chunk], depths)
+            pending.append((chunk, depths, future))
+            if len(pending) > 2 * workers:
+                chunk, depths, future = pending.popleft()
+                yield from get_rows(chunk, depths, future)
+        while pending:
+            chunk, depths, future = pending.popleft()
+            yield from get_rows(chunk, depths, future)
+
+
+class Summary:
+    def __init__(self):
+        self.agents = {}
+
+    def add(self, row):
+        totals = self.agents.setdefault(row['agent'], {'moves': 0, 'best_moves': 0, 'loss': 0.0,
+                                                       'mistakes': 0, 'blunders': 0})
+        totals['moves'] += 1
+        totals['best_moves'] += row['loss'] == 0
+        totals['loss'] += row['loss']
+        totals['mistakes'] += row['mark'] == '?'
+        totals['blunders'] += row['mark'] == '??'
+
+    def get_rows(self):
+        return [{'agent': agent, 'moves': totals['moves'], 'best_moves': totals['best_moves'],
+                 'accuracy': round(totals['best_moves'] / totals['moves'], 4),
+                 'mean_loss': round(totals['loss'] / totals['moves'], 3),
+                 'mistakes': totals['mistakes'], 'blunders': totals['blunders']}
+                for agent, totals in sorted(self.agents.items())]
+
+    def __str__(self):
+        return '\n'.join(f'{row["agent"]}: {row["moves"]} moves, best move {row["accuracy"] * 100:.1f}%, '
+                         f'mean loss {row["mean_loss"]:.2f} tiles, {row["mistakes"]} mistakes, '
+                         f'{row["blunders"]} blunders' for row in self.get_rows())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search the positions of played games again, deeper, in parallel.')
+    parser.add_argument('paths', nargs='*', default=[config.LOG_FOLDER], help='log files or folders of them')
+    parser.add_argument('--depth', type=int, default=4, help='at least one ply more than the game was played at')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk', type=int, default=8, help='positions sent to a worker at once')
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--output', help='prefix of the moves and summary files, ANALYSIS_<time> in logs/ by default')
+    args = parser.parse_args()
+    if args.depth < 2:
+        parser.error('the played move is searched a ply less deep, depth has to be at least 2')
+
+    prefix = args.output or os.path.join(config.LOG_FOLDER, f'ANALYSIS_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}')
+    summary = Summary()
+    start_time = time.perf_counter()
+    count = 0
+    with open(f'{prefix}_moves.{"csv" if args.format == "csv" else "jsonl"}', 'w', newline='') as moves_file:
+        writer = csv.DictWriter(moves_file, FIELDS) if args.format == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for row in analyze(args.paths, args.depth, args.workers, args.chunk):
+            summary.add(row)
+            count += 1
+            if writer:
+                writer.writerow(row)
+            else:
+                moves_file.write(json.dumps(row) + '\n')
+
+    with open(f'{prefix}_summary.{args.format}', 'w', newline='') as summary_file:
+        if args.format == 'csv':
+            writer = csv.DictWriter(summary_file, SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(summary.get_rows())
+        else:
+            json.dump(summary.get_rows(), summary_file, indent=2)
+    elapsed = time.perf_counter() - start_time
+    print(f'{count} positions in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f}/s), saved to {prefix}_*')
+    print(summary)
@@ -0,0 +1,92 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import config
+import evaluation
+from agents import create_agents
+from map_loader import load_state
+
+COLUMNS = ['map', 'area', 'players', 'load_ms', 'perft_nodes', 'nodes_per_sec', 'evals_per_sec',
+           'agent', 'agent_move_sec', 'agent_nodes_per_sec', 'agent_branching_factor', 'peak_kib']
+
+
+def perft(state, depth):
+    if depth == 0 or state.is_goal_state():
+        return 1
+    nodes = 1
+    for action in state.get_legal_actions():
+        nodes += perft(state.generate_successor_state(action), depth - 1)
+    return nodes
+
+
+def benchmark_map(map_name, depth, max_rounds, agent_depth):
+    start_time = time.perf_counter()
+    state = load_state(map_name, max_rounds)
+    load_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    nodes = perft(state, depth)
+    perft_time = time.perf_counter() - start_time
+
+    # memory is measured in a separate pass, tracing slows the search down
+    tracemalloc.start()
+    perft(state, depth)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    evals = 0
+    start_time = time.perf_counter()
+    while evals < 10 or time.perf_counter() - start_time < 0.2:
+        evaluation.estimated_scores(state)
+        evals += 1
+    eval_time = time.perf_counter() - start_time
+
+    agent_name = 'NegamaxABAgent' if state.get_num_of_players() == 2 else 'MaxNAgent'
+    agent = create_agents([agent_name], 1)[0]
+    agent.choose(state, agent_depth)
+
+    return {
+        'map': map_name,
+        'area': config.M * config.N,
+        'players': state.get_num_of_players(),
+        'load_ms': round(load_time * 1000, 2),
+        'perft_nodes': nodes,
+        'nodes_per_sec': round(nodes / perft_time),
+        'evals_per_sec': round(evals / eval_time),
+        'agent': agent_name,
+        'agent_move_sec': round(agent.stats.total_time, 3),
+        'agent_nodes_per_sec': round(agent.stats.get_nodes_per_sec()),
+        'agent_branching_factor': round(agent.stats.get_branching_factor(), 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure engine scaling over generated maps.')
+    parser.add_argument('--maps', default=os.path.join(config.GENERATED_MAP_FOLDER, '*.txt'),
+                        help='glob of map files (default: the generated corpus)')
+    parser.add_argument('--depth', type=int, default=3, help='perft depth')
+    parser.add_argument('--agent-depth', type=int, default=2, help='search depth of the timed agent move')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--csv', help='also write results to this file')
+    args = parser.parse_args()
+
+    rows = []
+    writer = csv.DictWriter(sys.stdout, COLUMNS, delimiter='\t')
+    writer.writeheader()
+    paths = sorted(glob.glob(args.maps), key=lambda p: (os.path.getsize(p), p))
+    for path in paths:
+        row = benchmark_map(os.path.relpath(path, config.MAP_FOLDER), args.depth, args.rounds, args.agent_depth)
+        writer.writerow(row)
+        sys.stdout.flush()
+        rows.append(row)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as file:
+            csv_writer = csv.DictWriter(file, COLUMNS)
+            csv_writer.writeheader()
+            csv_writer.writerows(rows)
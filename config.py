@@ -1,26 +1,66 @@
 import os
 
-import screeninfo
-
-monitor = screeninfo.get_monitors()[0]
-
 # parameters
 MAX_PLAYERS = 4
+SPACESHIP_KINDS = ['A', 'B', 'C', 'D']
+COLOR_KINDS = ['a', 'b', 'c', 'd']
+ABYSS_KINDS = ['0']
+FREE_KINDS = ['_']
 M = None
 N = None
-SCREEN_WIDTH = monitor.width
-SCREEN_HEIGHT = monitor.height
+SCREEN_WIDTH = None  # of the first monitor, see get_screen_size
+SCREEN_HEIGHT = None
 MIN_TILE_SIZE = 32
 TILE_SIZE = 64
 MAX_TILE_SIZE = 128
-TILE_STEP = 0.05
-TILE_OFFSET = None
+VIEWPORT_MIN_TILE_SIZE = 4
+VIEWPORT_SCROLL_TILES = 4
 INFO_FONT = None
 INFO_HEIGHT = 30
 INFO_SIDE_OFFSET = 10
 FRAMES_PER_SEC = 120
 SLEEP_TIME = 0.001
+MOVE_DELAY = 0.5
+MOVES_PER_SEC = 2  # animation speed, every move takes the same time whatever its length
+TURBO = False  # show only the result of every move, without animation or delay
+TRANSITION_BUFFER = 1  # moves the simulation may think ahead of the animation
+SIMULATION_CLOSE_TIMEOUT = 2
+TIME_BANK = 0  # total seconds per player, 0 uses a fixed time per move
+TIME_INCREMENT = 0
+HARD_DEADLINE_FACTOR = 3
+DEADLINE_MARGIN = 0.05
+AVERAGE_ACTIONS = 6
+MIN_COMPLEXITY = 0.5
+MAX_COMPLEXITY = 2
+REGION_WEIGHT = 0.5
+TUNED_WEIGHTS = False  # evaluate with WEIGHTS_FILE, only once it beats the defaults in tune.py --validate
+TT_MAX_ENTRIES = 1_000_000
+SHARED_TT_ENTRIES = 0  # size of a transposition table shared by all search processes, 0 is off
+TT_SYMMETRY = False  # mirror images on a symmetric map share entries, off: the saved nodes do not pay for the keys
+LATE_MOVE_REDUCTIONS = False  # defaults of the selective search switches of every agent
+FUTILITY_PRUNING = False  # sound but rarely prunes, see README
+STAY_REDUCTION = False
+LMR_MIN_DEPTH = 3
+LMR_FULL_MOVES = 3  # moves searched in full before the later ones are reduced
+LMR_REDUCTION = 1
+MAXN_SHARES = False  # MaxN maximizes shares of the estimated scores, which prune, instead of the estimates
+EXPECTIMAX_SAMPLES = 0  # replies searched per chance node, 0 searches all of them
+EXPECTIMAX_BOUND = 1.0  # evaluation range as a fraction of the tiles, below 1 it is an assumption
+EXPECTIMAX_PROBING = False  # Star2: probe one move of every reply before searching them in full
+PONDER = False
+PONDER_WORKERS = None  # None uses all but one core
+PONDER_MAX_POSITIONS = 8
+PONDER_TT_PLIES = 2
+WORKERS = False  # run every agent in its own process
+WORKER_START_TIMEOUT = 10
+WORKER_KILL_GRACE = 0.5
+RECORD = False  # write every game as its map and the changes of every move to logs/
+MISTAKE_LOSS = 1  # score loss in tiles against the deeper search that marks a move in analyze.py
+BLUNDER_LOSS = 3
 DEBUG = True
+PROFILER = None  # None, 'cprofile' or 'sample'
+PROFILE_SAMPLE_INTERVAL = 0.001
+PROFILE_TOP = 15
 
 # define colors
 WHITE = (255, 255, 255)
@@ -36,6 +76,19 @@ LIGHT_GREEN = (160, 210, 130)
 # paths
 GAME_FOLDER = os.path.dirname(__file__)
 MAP_FOLDER = os.path.join(GAME_FOLDER, 'maps')
+GENERATED_MAP_FOLDER = os.path.join(MAP_FOLDER, 'generated')
 IMG_FOLDER = os.path.join(GAME_FOLDER, 'img')
 LOG_FOLDER = os.path.join(GAME_FOLDER, 'logs')
 FONT_FOLDER = os.path.join(GAME_FOLDER, 'fonts')
+CACHE_FOLDER = os.path.join(GAME_FOLDER, 'cache')  # sprite atlases scaled to a tile size
+WEIGHTS_FILE = os.path.join(GAME_FOLDER, 'weights.json')  # evaluation weights written by tune.py
+
+
+def get_screen_size():
+    # only the window needs the monitor, headless games and workers never import screeninfo
+    global SCREEN_WIDTH, SCREEN_HEIGHT
+    if SCREEN_WIDTH is None:
+        import screeninfo
+        monitor = screeninfo.get_monitors()[0]
+        SCREEN_WIDTH, SCREEN_HEIGHT = monitor.width, monitor.height
+    return SCREEN_WIDTH, SCREEN_HEIGHT
@@ -0,0 +1,248 @@
+"""
+REACHABLE-AREA EVALUATION
+Every tile that is not a pit can still change colour until the game ends,
+so raw tile difference ignores most of what decides the game. This module
+splits the board into regions by slide distance: a tile belongs to the ship
+that can paint it in the fewest of its own remaining moves (a Voronoi
+partition). Tiles reached by two ships in the same number of moves belong
+to nobody.
+
+All sets are bitboards laid out as in state.py. One move of a ship is
+expanded for a whole set of positions at once with occluded fills: for
+each direction the positions are slid through the free-tile mask using
+Kogge-Stone shifts (1, 2, 4, ... tiles), which covers every slide in
+O(log(max(M, N))) big-int operations instead of a per-tile loop.
+
+For instance, ship A (on move) and ship B with 1 move each:
+BOARD        A region     B region
+0 A _ _      0 1 1 1      0 0 0 0
+_ _ 0 _      1 0 0 0      0 0 0 1
+_ _ _ B      1 0 0 0      0 1 1 1
+
+Estimated score of a ship = its tiles + REGION_WEIGHT * tiles of its region
+that are not already its colour. The region is bounded by the moves the
+ship has left. Goal states (round limit or full board) are scored with the
+real scores, whatever the weights.
+
+With tuned weights (WEIGHTS_FILE, written by tune.py from self-play, used
+with TUNED_WEIGHTS) the estimate is a weighted sum of per-ship features
+instead: tiles, region tiles and mobility (tiles the ship can end its next
+move on). The default weights (1, REGION_WEIGHT, 0) are the estimate above.
+There is no tempo feature: between two ships the moves left only tell whose
+turn it is, and a weight on it swings the value with the parity of the
+search depth.
+"""
+import functools
+import json
+import os
+
+import config
+from util import popcount
+
+FEATURES = ['tiles', 'region', 'mobility']
+WEIGHTS_VERSION = 2
+DEFAULT_WEIGHTS = (1.0, config.REGION_WEIGHT, 0.0)
+
+
+@functools.lru_cache(maxsize=None)
+def get_board_masks(m, n):
+    all_ones_mask = (1 << (m * n)) - 1
+    first_col_mask = 0
+    for i in range(m):
+        first_col_mask |= 1 << (i * n)
+    last_col_mask = first_col_mask << (n - 1)
+    return all_ones_mask, first_col_mask, last_col_mask
+
+
+def fill_up(gen, pro, n, length):
+    step = n
+    while step < length:
+        gen |= pro & (gen >> step)
+        pro &= pro >> step
+        step <<= 1
+    return gen
+
+
+def fill_down(gen, pro, n, length):
+    step = n
+    while step < length:
+        gen |= pro & (gen << step)
+        pro &= pro << step
+        step <<= 1
+    return gen
+
+
+def fill_right(gen, pro, n):
+    step = 1
+    while step < n:
+        gen |= pro & (gen << step)
+        pro &= pro << step
+        step <<= 1
+    return gen
+
+
+def fill_left(gen, pro, n):
+    step = 1
+    while step < n:
+        gen |= pro & (gen >> step)
+        pro &= pro >> step
+        step <<= 1
+    return gen
+
+
+def expand_move(positions, empty, first_col_mask, last_col_mask):
+    # one move of every position in the set: returns (painted tiles, reachable end positions)
+    n = config.N
+    length = config.M * config.N
+    empty_right = empty & ~first_col_mask
+    empty_left = empty & ~last_col_mask
+
+    up = fill_up(positions, empty, n, length)
+    down = fill_down(positions, empty, n, length)
+    right = fill_right(positions, empty_right, n)
+    left = fill_left(positions, empty_left, n)
+    painted = up | down | right | left
+
+    # slide ends are filled tiles whose next tile in that direction is blocked
+    ends = ((up & ~(empty << n)) | (down & ~(empty >> n)) |
+            (right & ~(empty_right >> 1)) | (left & ~(empty_left << 1)))
+    # one tile movements
+    steps = (((positions >> n) | (positions << n)) & empty) | \
+            ((positions << 1) & empty_right) | ((positions >> 1) & empty_left)
+    return painted, positions | ends | steps
+
+
+def flood_fill(seed, free_mask):
+    # all tiles of free_mask 4-connected to seed, growing whole lines per iteration
+    _, first_col_mask, last_col_mask = get_board_masks(config.M, config.N)
+    n = config.N
+    length = config.M * config.N
+    region = seed & free_mask
+    while True:
+        grown = (fill_up(region, free_mask, n, length) | fill_down(region, free_mask, n, length) |
+                 fill_right(region, free_mask & ~first_col_mask, n) |
+                 fill_left(region, free_mask & ~last_col_mask, n))
+        if grown == region:
+            return region
+        region = grown
+
+
+def get_moves_left(state, player_ord):
+    rounds_left = state.get_max_rounds() - state.get_current_round()
+    return max(0, rounds_left - (1 if player_ord < state.get_on_move_ord() else 0))
+
+
+def reachable_regions(state):
+    all_ones_mask, first_col_mask, last_col_mask = get_board_masks(config.M, config.N)
+    ships = state.spaceships_positions_dict
+    free_mask = ~state.abyss_tiles_positions_int & all_ones_mask
+    num_of_players = state.get_num_of_players()
+    order = [chr(ord('A') + (state.get_on_move_ord() + i) % num_of_players) for i in range(num_of_players)]
+
+    others = {kind: 0 for kind in order}
+    for kind in order:
+        for other, position in ships.items():
+            if other != kind:
+                others[kind] |= position
+    moves_left = {kind: get_moves_left(state, ord(kind) - ord('A')) for kind in order}
+    positions = {kind: ships[kind] for kind in order}
+    painted = {kind: 0 for kind in order}
+    regions = {kind: 0 for kind in order}
+    seen = 0
+
+    depth = 0
+    active = [kind for kind in order if moves_left[kind] > 0]
+    while active:
+        depth += 1
+        reached = {}
+        stable = set()
+        for kind in active:
+            empty = free_mask & ~others[kind]
+            new_painted, new_positions = expand_move(positions[kind], empty, first_col_mask, last_col_mask)
+            if new_positions == positions[kind]:
+                stable.add(kind)
+            positions[kind] = new_positions
+            reached[kind] = new_painted & ~painted[kind] & ~seen
+            painted[kind] |= new_painted
+
+        contested = 0
+        claimed = 0
+        for kind in active:
+            contested |= claimed & reached[kind]
+            claimed |= reached[kind]
+        for kind in active:
+            regions[kind] |= reached[kind] & ~contested
+        seen |= claimed
+
+        active = [kind for kind in active
+                  if moves_left[kind] > depth and kind not in stable and seen != free_mask]
+    return regions
+
+
+def load_weights(path):
+    if not path or not os.path.exists(path):
+        return DEFAULT_WEIGHTS
+    with open(path, 'r') as file:
+        data = json.load(file)
+    if data.get('version') != WEIGHTS_VERSION or data.get('features') != FEATURES:
+        raise Exception(f'Weights file {path} has version {data.get("version")} with features '
+                        f'{data.get("features")}, expected version {WEIGHTS_VERSION} with {FEATURES}!')
+    return tuple(float(weight) for weight in data['weights'])
+
+
+def save_weights(path, weights, **metadata):
+    with open(path, 'w') as file:
+        json.dump({'version': WEIGHTS_VERSION, 'features': FEATURES, 'weights': [float(weight) for weight in weights],
+                   **metadata}, file, indent=2)
+
+
+WEIGHTS = load_weights(config.WEIGHTS_FILE) if config.TUNED_WEIGHTS else DEFAULT_WEIGHTS
+
+
+MAX_MOBILITY = 8  # four slide ends and four one-tile steps
+
+
+def get_mobility(state, kind):
+    # tiles the ship can end its next move on, staying not counted
+    all_ones_mask, first_col_mask, last_col_mask = get_board_masks(config.M, config.N)
+    position = state.spaceships_positions_dict[kind]
+    empty = ~state.abyss_tiles_positions_int & all_ones_mask
+    for other, other_position in state.spaceships_positions_dict.items():
+        if other != kind:
+            empty &= ~other_position
+    _, ends = expand_move(position, empty, first_col_mask, last_col_mask)
+    return popcount(ends & ~position)
+
+
+def get_features(state):
+    regions = reachable_regions(state)
+    result = {}
+    for kind, region in regions.items():
+        color = state.colored_tiles_positions_dict[kind.lower()]
+        result[kind] = (state.get_score(kind), popcount(region & ~color), get_mobility(state, kind))
+    return result
+
+
+def estimated_scores(state, weights=None):
+    if state.is_goal_state():
+        return state.get_scores()
+    tiles_weight, region_weight, mobility_weight = weights or WEIGHTS
+    regions = reachable_regions(state)
+    result = {}
+    for kind, region in regions.items():
+        color = state.colored_tiles_positions_dict[kind.lower()]
+        value = tiles_weight * state.get_score(kind) + region_weight * popcount(region & ~color)
+        if mobility_weight:
+            value += mobility_weight * get_mobility(state, kind)
+        result[kind] = value
+    return result
+
+
+def evaluate(state, agent_char, opponent_char, weights=None):
+    scores = estimated_scores(state, weights)
+    return scores[agent_char] - scores[opponent_char]
+
+
+def evaluate_vector(state, weights=None):
+    scores = estimated_scores(state, weights)
+    return tuple(scores[chr(ord('A') + i)] for i in range(state.get_num_of_players()))
@@ -0,0 +1,114 @@
+import json
+import os
+from datetime import datetime
+
+import config
+from util import popcount
+
+
+def get_start_message(state, agent_names):
+    # the seats and the position a game starts from, the logs are read back from it by analyze.py
+    seats = ', '.join(f'{chr(ord("A") + i)} {name}' for i, name in enumerate(agent_names))
+    return f'Agents: {seats}\nRound {state.get_current_round() + 1} / {state.get_max_rounds()}\nIn state\n{state}'
+
+
+def get_cells(mask):
+    # (row, col) of every set bit, as many steps as there are cells
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(divmod(low.bit_length() - 1, config.N))
+        mask ^= low
+    return cells
+
+
+class MoveDiff:
+    # what one move changed: the tiles the mover gained, those among them taken from every other colour
+    # and the scores after it
+    def __init__(self, mover, src, dst, gained, stolen, scores, current_round, max_rounds):
+        self.mover = mover
+        self.src = src
+        self.dst = dst
+        self.gained = gained
+        self.stolen = stolen
+        self.scores = scores
+        self.current_round = current_round
+        self.max_rounds = max_rounds
+
+    @classmethod
+    def between(cls, state, action, next_state):
+        mover = state.get_on_move_chr()
+        colors, next_colors = state.colored_tiles_positions_dict, next_state.colored_tiles_positions_dict
+        gained = next_colors[mover.lower()] & ~colors[mover.lower()]
+        stolen = {kind: color & gained for kind, color in colors.items() if kind != mover.lower() and color & gained}
+        return cls(mover, action[0], action[1], gained, stolen, next_state.get_scores(),
+                   state.get_current_round(), state.get_max_rounds())
+
+    def get_gained_count(self):
+        return popcount(self.gained)
+
+    def get_stolen_count(self):
+        return sum(popcount(mask) for mask in self.stolen.values())
+
+    def to_dict(self):
+        return {'round': self.current_round, 'mover': self.mover, 'from': self.src, 'to': self.dst,
+                'gained': get_cells(self.gained),
+                'stolen': {kind: get_cells(mask) for kind, mask in self.stolen.items()},
+                'scores': self.scores}
+
+    def __str__(self):
+        stolen = ''.join(f', {popcount(mask)} from {kind}' for kind, mask in self.stolen.items())
+        return (f'Round {self.current_round + 1} / {self.max_rounds}: {self.mover} {self.src} -> {self.dst}, '
+                f'+{self.get_gained_count()} tiles{stolen}, scores {self.scores}')
+
+
+class EventStream:
+    # every move is published once, renderer, logger, recorder and statistics subscribe to it
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def publish(self, diff):
+        for callback in self.subscribers:
+            callback(diff)
+
+
+class MoveTally:
+    def __init__(self):
+        self.moves = {}
+        self.gained = {}
+        self.stolen = {}
+        self.stays = {}
+
+    def add(self, diff):
+        mover = diff.mover
+        self.moves[mover] = self.moves.get(mover, 0) + 1
+        self.gained[mover] = self.gained.get(mover, 0) + diff.get_gained_count()
+        self.stolen[mover] = self.stolen.get(mover, 0) + diff.get_stolen_count()
+        self.stays[mover] = self.stays.get(mover, 0) + (diff.src == diff.dst)
+
+    def __str__(self):
+        return ', '.join(f'{mover}: {self.moves[mover]} moves ({self.stays[mover]} stays), '
+                         f'{self.gained[mover]} tiles gained, {self.stolen[mover]} of them stolen'
+                         for mover in sorted(self.moves))
+
+
+class Recorder:
+    # a game as its map and one line of changes per move (JSON lines)
+    def __init__(self, state, agent_names, prefix='RECORD'):
+        if not os.path.exists(config.LOG_FOLDER):
+            os.mkdir(config.LOG_FOLDER)
+        self.file = open(os.path.join(config.LOG_FOLDER,
+                                      f'{prefix}_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.jsonl'), 'w')
+        self.file.write(json.dumps({'map': state.get_map_lines(), 'max_rounds': state.get_max_rounds(),
+                                    'round': state.get_current_round(), 'on_move': state.get_on_move_ord(),
+                                    'agents': agent_names}) + '\n')
+
+    def write(self, diff):
+        self.file.write(json.dumps(diff.to_dict()) + '\n')
+
+    def close(self):
+        self.file.close()
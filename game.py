@@ -1,14 +1,16 @@
 import os
-import threading
 import time
-from queue import Queue
 
 import pygame
 
 import config
-from sprites import Spaceship, AbyssTile, FreeTile, ColoredTile
-from state import State
-from util import TimedFunction, Timeout, Logger
+from agents import get_seat_names
+from events import EventStream, get_cells, get_start_message
+from map_loader import load_state
+from simulation import Simulation
+from sprites import Atlas, Spaceship, AbyssTile, FreeTile, ColoredTile
+from util import Logger
+from viewport import Viewport
 
 
 class Quit(Exception):
@@ -20,87 +22,63 @@ class EndGame(Exception):
 
 
 class Game:
-    def adjust_dimensions(self, lines):
-        config.M = len(lines)
-        config.N = len(lines[0].strip())
-        tile_height = int(config.SCREEN_HEIGHT * 0.9 / config.M)
-        tile_width = int(config.SCREEN_WIDTH * 0.9 / config.N)
-        if tile_height < config.MIN_TILE_SIZE:
-            raise Exception(f'Decrease the number of rows in map! '
-                            f'MIN_TILE_SIZE is {config.MIN_TILE_SIZE}px but {tile_height}px occurred.')
-        if tile_width < config.MIN_TILE_SIZE:
-            raise Exception(f'Decrease the number of columns in map! '
-                            f'MIN_TILE_SIZE is {config.MIN_TILE_SIZE}px but {tile_width}px occurred.')
-        config.TILE_SIZE = int(min(config.MAX_TILE_SIZE, tile_height, tile_width))
-        config.TILE_OFFSET = int(config.TILE_SIZE * config.TILE_STEP)
-        self.WIDTH = config.N * config.TILE_SIZE
-        self.HEIGHT = config.M * config.TILE_SIZE
+    def adjust_dimensions(self):
+        screen_width, screen_height = config.get_screen_size()
+        tile_height = int(screen_height * 0.9 / config.M)
+        tile_width = int(screen_width * 0.9 / config.N)
+        if min(tile_height, tile_width) < config.MIN_TILE_SIZE:
+            # map does not fit on the screen, only the visible part of it is rendered
+            config.TILE_SIZE = config.MIN_TILE_SIZE
+            self.WIDTH = min(config.N * config.TILE_SIZE, int(screen_width * 0.9))
+            self.HEIGHT = min(config.M * config.TILE_SIZE, int(screen_height * 0.9))
+            self.viewport = Viewport(self.WIDTH, self.HEIGHT)
+        else:
+            config.TILE_SIZE = int(min(config.MAX_TILE_SIZE, tile_height, tile_width))
+            self.WIDTH = config.N * config.TILE_SIZE
+            self.HEIGHT = config.M * config.TILE_SIZE
         self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT + config.INFO_HEIGHT), flags=pygame.HIDDEN)
 
     def load_map(self, map_name):
-        try:
-            self.sprites_free_tiles = pygame.sprite.Group()
-            self.sprites_abyss_tiles = pygame.sprite.Group()
-            self.sprites_colored_tiles = pygame.sprite.Group()
-            self.sprites_spaceships = pygame.sprite.Group()
+        self.sprites_free_tiles = pygame.sprite.Group()
+        self.sprites_abyss_tiles = pygame.sprite.Group()
+        self.sprites_colored_tiles = pygame.sprite.Group()
+        self.sprites_spaceships = pygame.sprite.Group()
 
-            self.colored_map = {}
-            self.spaceships_map = {}
+        self.colored_map = {}
+        self.spaceships_map = {}
 
-            with open(os.path.join(config.MAP_FOLDER, map_name), 'r') as file:
-                lines = file.readlines()
-                self.adjust_dimensions(lines)
+        state = load_state(map_name, self.max_rounds)
+        self.adjust_dimensions()
 
-                mask = 1
-                all_ones_mask = (1 << (config.M * config.N)) - 1
-                abyss_tiles_positions_int = 0 & all_ones_mask
-                colored_tiles_positions_dict = {}
-                spaceships_positions_dict = {}
+        for kind, position in state.spaceships_positions_dict.items():
+            idx = position.bit_length() - 1
+            sprite = Spaceship(kind, (idx // config.N, idx % config.N), kind.lower())
+            sprite.add(self.sprites_spaceships)
+            self.spaceships_map[(idx // config.N, idx % config.N)] = sprite
+        if self.viewport:
+            self.viewport.center_on(next(iter(self.spaceships_map)))
+            return state
 
-                for i, line in enumerate(lines):
-                    for j, char in enumerate(line.strip()):
-                        tile = FreeTile((i, j))
-                        tile.add(self.sprites_free_tiles)
-                        if char not in FreeTile.kinds():
-                            error_flag = True
-                            if char.lower() in ColoredTile.kinds():
-                                error_flag = False
-                                sprite = ColoredTile(char.lower(), (i, j))
-                                sprite.add(self.sprites_colored_tiles)
-                                self.colored_map[(i, j)] = sprite
-                                if char.lower() not in colored_tiles_positions_dict:
-                                    colored_tiles_positions_dict[char.lower()] = 0 & all_ones_mask
-                                colored_tiles_positions_dict[char.lower()] |= mask
-                                if char in Spaceship.kinds():
-                                    sprite = Spaceship(char, (i, j), char)
-                                    sprite.add(self.sprites_spaceships)
-                                    self.spaceships_map[(i, j)] = sprite
-                                    if char not in spaceships_positions_dict:
-                                        spaceships_positions_dict[char] = mask
-                            if char in AbyssTile.kinds():
-                                error_flag = False
-                                sprite = AbyssTile((i, j))
-                                sprite.add(self.sprites_abyss_tiles)
-                                abyss_tiles_positions_int |= mask
-                            if error_flag:
-                                raise Exception(f'Illegal character {char} in map!')
-                        mask <<= 1
-            return State(spaceships_positions_dict,
-                         colored_tiles_positions_dict,
-                         abyss_tiles_positions_int, self.max_rounds)
-        except Exception as e:
-            raise e
+        abyss_tiles_positions_int = state.get_state('0')
+        for i in range(config.M):
+            for j in range(config.N):
+                mask = 1 << (i * config.N + j)
+                tile = FreeTile((i, j))
+                tile.add(self.sprites_free_tiles)
+                if mask & abyss_tiles_positions_int:
+                    sprite = AbyssTile((i, j))
+                    sprite.add(self.sprites_abyss_tiles)
+                for kind, color in state.colored_tiles_positions_dict.items():
+                    if mask & color:
+                        sprite = ColoredTile(kind, (i, j))
+                        sprite.add(self.sprites_colored_tiles)
+                        self.colored_map[(i, j)] = sprite
+        return state
 
-    def get_algorithms(self, algorithms_names):
-        num_of_players = self.state.get_num_of_players()
-        if len(algorithms_names) >= num_of_players:
-            algorithms_names = algorithms_names[:num_of_players]
-        else:
-            algorithms_names += [algorithms_names[-1]] * (num_of_players - len(algorithms_names))
-        module_agents = __import__('agents')
-        return [getattr(module_agents, algo_name) for algo_name in algorithms_names]
-
-    def __init__(self, algorithms_names, map_name, max_rounds, max_think_time, max_depth):
+    def __init__(self, algorithms_names, map_name, max_rounds, max_think_time, max_depth,
+                 move_delay=config.MOVE_DELAY, start_time=None):
+        # time to the first frame is measured from start_time, by default from here
+        self.start_time = start_time or time.perf_counter()
         self.logger = Logger()
         pygame.font.init()
         config.INFO_FONT = pygame.font.Font(os.path.join(config.FONT_FOLDER, 'info_font.ttf'), 22)
@@ -114,104 +92,151 @@ class Game:
         self.sprites_spaceships = None
         self.spaceships_map = None
         self.colored_map = None
+        self.viewport = None
+        self.trail = []
         self.running = True  # application running
         self.playing = False  # play/pause
         self.moving = False  # current agent moving
         self.done = False  # reached goal state
         self.max_rounds = max_rounds
         self.think_time = 0
-        self.max_think_time = max_think_time
-        self.max_depth = max_depth
+        self.last_stats = None
+        self.transition = None
+        self.move_delay = move_delay  # minimum pause between moves, not counted as think time
+        self.next_move_time = 0
+        self.moves_per_sec = config.MOVES_PER_SEC
+        self.turbo = config.TURBO
+        self.path = None  # cells of the move being animated
+        self.painted = 0  # cells of the path already passed
+        self.unpainted = 0  # tiles the move gains that are not painted yet
+        self.move_start_time = 0
+        self.pause_time = 0
+        self.redraw = True
         self.state = self.load_map(map_name)
-        self.algorithms = self.get_algorithms(algorithms_names)
+        self.agent_names = get_seat_names(algorithms_names, self.state.get_num_of_players())
+        self.simulation = Simulation(algorithms_names, map_name, max_rounds, max_think_time, max_depth)
+        # the window and the log follow the moves through their diffs
+        self.stream = EventStream()
+        self.stream.subscribe(self.apply_diff)
+        self.stream.subscribe(self.log_diff)
         self.clock = pygame.time.Clock()
 
-    def get_action(self):
-        try:
-            tf_queue = Queue(1)
-            tf = TimedFunction(threading.current_thread().ident,
-                               tf_queue, self.max_think_time,
-                               self.algorithms[self.state.get_on_move_ord()].get_chosen_action,
-                               self.algorithms[self.state.get_on_move_ord()],
-                               self.state,
-                               self.max_depth)
-            tf.daemon = True
-            tf.start()
-            sleep_time = config.SLEEP_TIME
-            while tf_queue.empty():
-                time.sleep(sleep_time)
-                self.draw_info_text()
-                self.events()
-            action, elapsed = tf_queue.get(block=False)
-            return action, elapsed
-        except Timeout:
-            print(f'ERROR: Agent action took more than {self.max_think_time} seconds!')
+    def get_transition(self):
+        # the simulation thinks ahead, a ready move is only picked up when the previous one has been shown
+        if time.time() < self.next_move_time or (message := self.simulation.poll()) is None:
+            return None
+        if isinstance(message, str):
+            self.logger.log_error(message, to_std_out=True)
             raise Quit()
+        self.transition = message
+        self.think_time = message.think_time
+        self.last_stats = message.stats
+        return message
 
-    def perform_action(self):
-        action, self.think_time = self.get_action()
+    @staticmethod
+    def get_path(action):
         current_pos, target_pos = action
         row_diff = target_pos[0] - current_pos[0]
         col_diff = target_pos[1] - current_pos[1]
         loop_step = 1 if row_diff + col_diff > 0 else -1
-        path = [
+        return [
             (current_pos[0], current_pos[1] + x) if row_diff == 0 else (current_pos[0] + x, current_pos[1])
             for x in range(0, col_diff + row_diff + loop_step, loop_step)
         ]
-        return action, path
 
-    def print_info(self, action):
-        info_text = (f'\nRound {self.state.get_current_round() + 1} / {self.state.get_max_rounds()}\n'
-                     f'In state\n'
-                     f'{self.state}\n'
-                     f'agent {self.state.get_on_move_chr()} chose action {action} '
-                     f'from actions {self.state.get_legal_actions()}\n'
-                     f'Think time was {self.think_time:.2f} seconds.\n')
-        self.logger.log_info(info_text, to_std_out=config.DEBUG)
+    def log_diff(self, diff):
+        transition = self.transition
+        self.logger.log_info(f'{diff}\n'
+                             f'Think time was {transition.think_time:.2f} seconds ({transition.deadline}).\n'
+                             f'Clock: {transition.clock}\n'
+                             f'Search: {transition.stats}\n', to_std_out=config.DEBUG)
+
+    def apply_diff(self, diff):
+        # only the tiles the move gained are repainted, in turbo mode all of them are left for here
+        for position in get_cells(self.unpainted):
+            self.paint(diff.mover.lower(), position)
+        self.unpainted = 0
+        self.spaceships_map[diff.dst] = self.spaceships_map.pop(diff.src)
+        self.spaceships_map[diff.dst].place_to(diff.dst)
+
+    def start_move(self, transition):
+        self.path = self.get_path(transition.action)
+        self.painted = 1  # the spaceship stands on its own colour
+        self.unpainted = transition.diff.gained
+        self.move_start_time = time.time()
+        self.moving = True
 
-    def perform_moving(self, current_pos, target_pos, path, action):
-        if current_pos != target_pos:
-            self.spaceships_map[target_pos] = self.spaceships_map[current_pos]
-            del self.spaceships_map[current_pos]
-        sprite = ColoredTile(self.state.get_on_move_chr().lower(), target_pos)
-        if target_pos in self.colored_map:
-            self.colored_map[target_pos].remove(self.sprites_colored_tiles)
+    def paint(self, kind, position):
+        if self.viewport:
+            self.trail.append(position)
+            return
+        sprite = ColoredTile(kind, position)
+        if position in self.colored_map:
+            self.colored_map[position].remove(self.sprites_colored_tiles)
         sprite.add(self.sprites_colored_tiles)
-        self.colored_map[target_pos] = sprite
-        if path:
-            current_pos = target_pos
-            target_pos = path.pop(0)
-        else:
-            self.print_info(action)
-            self.state = self.state.generate_successor_state(action)
-            self.moving = False
-        return current_pos, target_pos
+        self.colored_map[position] = sprite
+
+    def animate(self):
+        # every move takes 1 / moves_per_sec seconds whatever its length, in turbo mode only its result is shown
+        steps = len(self.path) - 1
+        fraction = 1 if self.turbo else min(1.0, (time.time() - self.move_start_time) * self.moves_per_sec)
+        progress = fraction * steps
+        reached = int(progress)
+        while self.painted <= reached:
+            row, col = self.path[self.painted]
+            if (cell := 1 << (row * config.N + col)) & self.unpainted:
+                self.paint(self.transition.diff.mover.lower(), (row, col))
+                self.unpainted &= ~cell
+            self.painted += 1
+        if fraction < 1:
+            if reached < steps:
+                self.spaceships_map[self.path[0]].place_between(self.path[reached], self.path[reached + 1],
+                                                                progress - reached)
+            return
+        self.finish_move(self.transition)
+
+    def finish_move(self, transition):
+        self.stream.publish(transition.diff)
+        self.state = transition.next_state
+        self.trail = []
+        self.moving = False
+        self.next_move_time = time.time() + (0 if self.turbo else self.move_delay)
 
     def run(self):
         try:
-            self.logger.log_info('Starting simulation ...', to_std_out=config.DEBUG)
+            self.logger.log_info(f'Starting simulation ...\n{get_start_message(self.state, self.agent_names)}',
+                                 to_std_out=config.DEBUG)
+            self.simulation.start()
             self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT + config.INFO_HEIGHT),
                                                   flags=pygame.SHOWN)
-            action, path, current_pos, target_pos = None, None, None, None
+            if self.viewport:
+                pygame.key.set_repeat(200, 30)
             while self.running:
                 try:
                     if self.playing:
                         if self.state.is_goal_state():
                             self.logger.log_info(f'\nFinal state\n{self.state}', to_std_out=config.DEBUG)
                             raise EndGame()
-                        if not self.moving:
-                            action, path = self.perform_action()
-                            current_pos = path.pop(0)
-                            target_pos = path.pop(0) if path else current_pos
-                            self.moving = True
-                        if not self.spaceships_map[current_pos].move_towards(target_pos):
-                            current_pos, target_pos = self.perform_moving(current_pos, target_pos, path, action)
-                    self.draw()
-                    self.events()
-                    self.clock.tick(config.FRAMES_PER_SEC)
+                        if not self.moving and (transition := self.get_transition()):
+                            self.start_move(transition)
+                        if self.moving:
+                            self.animate()
+                            self.redraw = True
+                    if self.redraw:
+                        self.draw()
+                        self.redraw = False
+                        if self.start_time:
+                            self.log_first_frame()
+                    if self.playing:
+                        self.events(pygame.event.get())
+                        self.clock.tick(config.FRAMES_PER_SEC)
+                    else:
+                        # paused or done: nothing changes until an event comes, the window sleeps until then
+                        self.events([pygame.event.wait()] + pygame.event.get())
                 except EndGame:
                     self.playing = False
                     self.done = True
+                    self.redraw = True
                 except Quit:
                     self.playing = False
                     self.running = False
@@ -219,8 +244,15 @@ class Game:
             self.logger.log_error(repr(e))
             raise e
         finally:
+            self.simulation.close()
             self.logger.close()
 
+    def log_first_frame(self):
+        atlases = ', '.join(str(atlas) for atlas in Atlas.atlases.values())
+        self.logger.log_info(f'First frame {time.perf_counter() - self.start_time:.3f}s after start ({atlases})',
+                             to_std_out=config.DEBUG)
+        self.start_time = None
+
     def draw_info_text(self):
         self.screen.fill(config.BLACK, [0, self.HEIGHT, self.WIDTH, config.INFO_HEIGHT])
         if self.done:
@@ -234,6 +266,8 @@ class Game:
         text = config.INFO_FONT.render(f'{text_str}', True, config.GREEN)
         self.screen.blit(text, (self.WIDTH - text_width - config.INFO_SIDE_OFFSET, self.HEIGHT))
 
+        right_text_width = text_width
+
         total_text_width = 0
         for i, (key, val) in enumerate(sorted(self.state.get_scores().items())):
             text_str = f'{"  " if i else ""}{key}: {val:02d}'
@@ -241,23 +275,50 @@ class Game:
             text_width, text_height = config.INFO_FONT.size(text_str)
             self.screen.blit(text, (total_text_width + config.INFO_SIDE_OFFSET, self.HEIGHT))
             total_text_width += text_width
+
+        # search stats of the last move, shown only when there is room between scores and status
+        if self.last_stats:
+            text_str = self.last_stats.short_str()
+            text_width, text_height = config.INFO_FONT.size(text_str)
+            free_width = self.WIDTH - right_text_width - total_text_width - 4 * config.INFO_SIDE_OFFSET
+            if text_width <= free_width:
+                text = config.INFO_FONT.render(text_str, True, config.WHITE)
+                self.screen.blit(text, (total_text_width + 2 * config.INFO_SIDE_OFFSET +
+                                        (free_width - text_width) // 2, self.HEIGHT))
         pygame.display.flip()
 
     def draw(self):
         self.screen.fill(config.WHITE)
+        if self.viewport:
+            self.viewport.draw(self.screen, self.state, self.sprites_spaceships,
+                               self.trail, self.state.get_on_move_chr().lower())
+            self.draw_info_text()
+            return
         self.sprites_free_tiles.draw(self.screen)
         self.sprites_colored_tiles.draw(self.screen)
         self.sprites_abyss_tiles.draw(self.screen)
         self.sprites_spaceships.draw(self.screen)
         self.draw_info_text()
 
-    def events(self):
+    def events(self, events):
         # catch all events here
-        for event in pygame.event.get():
+        for event in events:
+            # a window event (exposed, resized) or a key may change the picture
+            self.redraw = True
             if event.type == pygame.QUIT or event.type == pygame.WINDOWCLOSE or \
                     event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 raise Quit()
+            if self.viewport:
+                self.viewport.handle_event(event)
             if self.done:
                 return
             if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                 self.playing = not self.playing
+                self.simulation.set_playing(self.playing)
+                # a paused move continues where it stopped
+                if self.playing:
+                    self.move_start_time += time.time() - self.pause_time
+                else:
+                    self.pause_time = time.time()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_t:
+                self.turbo = not self.turbo
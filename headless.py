@@ -0,0 +1,161 @@
+import copy
+import threading
+import time
+from queue import Queue
+
+import config
+from agents import Agent
+from events import EventStream, MoveDiff, MoveTally, Recorder, get_start_message
+from map_loader import load_state
+from ponder import Ponderer
+from sharedtt import SharedTranspositionTable
+from state import MapDescriptor, State
+from timecontrol import TimeControl
+from util import TimedFunction, Timeout, profile_call
+from worker import create_seats
+
+
+class Transition:
+    def __init__(self, state, action, think_time, stats, deadline, clock, next_state, diff):
+        self.state = state
+        self.action = action
+        self.think_time = think_time
+        self.stats = stats
+        self.deadline = deadline
+        self.clock = clock
+        self.next_state = next_state
+        self.diff = diff
+
+    def __getstate__(self):
+        # both states go as binary records of one map, sent along with its descriptor
+        descriptor = self.state.get_descriptor()
+        fields = self.__dict__.copy()
+        fields['descriptor'] = descriptor.to_bytes()
+        fields['state'] = self.state.to_bytes(descriptor)
+        fields['next_state'] = self.next_state.to_bytes(descriptor)
+        return fields
+
+    def __setstate__(self, fields):
+        descriptor = MapDescriptor.from_bytes(fields.pop('descriptor')).register()
+        fields['state'] = State.from_bytes(fields['state'], descriptor)
+        fields['next_state'] = State.from_bytes(fields['next_state'], descriptor)
+        self.__dict__.update(fields)
+
+
+class HeadlessGame:
+    def __init__(self, algorithms_names, map_name, max_rounds, max_think_time, max_depth, logger=None, agents=None):
+        self.logger = logger
+        self.max_depth = max_depth
+        self.state = load_state(map_name, max_rounds)
+        # agents passed in (e.g. workers kept for a whole tournament) are reused and left open
+        self.owns_agents = agents is None
+        self.algorithms = agents or create_seats(algorithms_names, self.state.get_num_of_players())
+        if not self.owns_agents:
+            for agent in self.algorithms:
+                agent.new_game()
+        self.shared_table = None
+        if config.SHARED_TT_ENTRIES and self.owns_agents:
+            # one table for every agent of the game, workers and ponderers attach to it by name
+            self.shared_table = SharedTranspositionTable.create()
+            for agent in self.algorithms:
+                if isinstance(agent, Agent):
+                    agent.transposition_table = self.shared_table
+                else:
+                    agent.attach_shared_table(self.shared_table.get_name())
+        self.time_control = TimeControl(self.state.get_num_of_players(), max_think_time,
+                                        config.TIME_BANK, config.TIME_INCREMENT)
+        self.deadline = None
+        if config.PONDER:
+            for agent in self.algorithms:
+                if isinstance(agent, Agent) and agent.ponderer is None:
+                    agent.ponderer = Ponderer(agent)
+        self.history = []
+        # every move is published as a diff of the state it changed
+        self.stream = EventStream()
+        self.tally = MoveTally()
+        self.stream.subscribe(self.tally.add)
+        if logger:
+            self.stream.subscribe(lambda diff: logger.log_info(str(diff), to_std_out=config.DEBUG))
+        self.recorder = None
+        if config.RECORD:
+            self.recorder = Recorder(self.state, [agent.name for agent in self.algorithms])
+            self.stream.subscribe(self.recorder.write)
+
+    def get_action(self):
+        agent = self.algorithms[self.state.get_on_move_ord()]
+        self.deadline = self.time_control.start_move(self.state)
+        if forced_action := self.time_control.get_forced_action(self.state):
+            agent.stats.reset()
+            return forced_action, 0
+        method, args = agent.choose, (self.state, self.max_depth, self.deadline)
+        if config.PROFILER and self.logger:
+            method, args = profile_call, (config.PROFILER, self.logger, agent.choose) + args
+        if self.deadline.hard is None:
+            start_time = time.time()
+            action = method(*args)
+            return action, time.time() - start_time
+
+        tf_queue = Queue(1)
+        tf = TimedFunction(threading.current_thread().ident, tf_queue, self.deadline.hard, method, *args)
+        tf.daemon = True
+        tf.start()
+        while tf_queue.empty():
+            time.sleep(config.SLEEP_TIME)
+        return tf_queue.get(block=False)
+
+    def step(self):
+        agent = self.algorithms[self.state.get_on_move_ord()]
+        action, think_time = self.get_action()
+        self.time_control.end_move(self.state.get_on_move_ord(), think_time)
+        if self.logger:
+            self.logger.log_info(f'agent {self.state.get_on_move_chr()} chose action {action} '
+                                 f'in {think_time:.3f} seconds ({agent.stats})\n'
+                                 f'Deadline: {self.deadline}, clock: {self.time_control}', to_std_out=config.DEBUG)
+        next_state = self.state.generate_successor_state(action)
+        transition = Transition(self.state, action, think_time, copy.copy(agent.stats), str(self.deadline),
+                                str(self.time_control), next_state, MoveDiff.between(self.state, action, next_state))
+        self.history.append(transition)
+        self.state = next_state
+        self.stream.publish(transition.diff)
+        self.start_pondering()
+        return transition
+
+    def start_pondering(self):
+        if self.state.is_goal_state():
+            return
+        for player_ord, agent in enumerate(self.algorithms):
+            if agent.ponderer and player_ord != self.state.get_on_move_ord():
+                agent.ponderer.start(self.state, player_ord, self.max_depth)
+
+    def close(self):
+        if self.owns_agents:
+            for agent in self.algorithms:
+                agent.close()
+        if self.shared_table:
+            if self.logger:
+                self.logger.log_info(str(self.shared_table), to_std_out=config.DEBUG)
+            self.shared_table.close()
+            self.shared_table = None
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def run(self):
+        if self.logger:
+            self.logger.log_info(get_start_message(self.state, [agent.name for agent in self.algorithms]),
+                                 to_std_out=config.DEBUG)
+        try:
+            self.start_pondering()
+            while not self.state.is_goal_state():
+                self.step()
+        except Timeout:
+            if self.logger:
+                self.logger.log_error(f'Agent {self.state.get_on_move_chr()} ran out of time '
+                                      f'({self.deadline})!', to_std_out=True)
+            raise
+        finally:
+            self.close()
+        if self.logger:
+            self.logger.log_info(f'\nFinal state\n{self.state}\nScores: {self.state.get_scores()}\n{self.tally}',
+                                 to_std_out=config.DEBUG)
+        return self.state.get_scores()
@@ -1,12 +1,39 @@
 import sys
+import time
 import traceback
 
-import pygame
-
 import config
-from game import Game
+from headless import HeadlessGame
+from util import Logger
 
+start_time = time.perf_counter()
 try:
+    options = [arg[2:].partition('=') for arg in sys.argv[1:] if arg.startswith('--')]
+    sys.argv = [arg for arg in sys.argv if not arg.startswith('--')]
+    headless = False
+    for name, _, value in options:
+        if name == 'headless':
+            headless = True
+        elif name == 'ponder':
+            config.PONDER = True
+        elif name == 'workers':
+            config.WORKERS = True
+        elif name == 'record':
+            config.RECORD = True
+        elif name == 'turbo':
+            config.TURBO = True
+        elif name == 'speed':
+            config.MOVES_PER_SEC = float(value)
+        elif name == 'shared-tt':
+            config.SHARED_TT_ENTRIES = int(value or 1 << 20)
+        elif name == 'profile':
+            config.PROFILER = value or 'cprofile'
+        elif name == 'bank':
+            config.TIME_BANK = float(value)
+        elif name == 'increment':
+            config.TIME_INCREMENT = float(value)
+        else:
+            raise Exception(f'Unknown option --{name}!')
     algorithms_names = sys.argv[1].split(',') if len(sys.argv) > 1 else ['RandomAgent']
     if len(algorithms_names) > config.MAX_PLAYERS:
         raise Exception('Too many agents!')
@@ -15,11 +42,21 @@ try:
     max_elapsed_time = int(sys.argv[4]) if len(sys.argv) > 4 else 0
     max_depth = int(sys.argv[5]) if len(sys.argv) > 5 else 5
     config.DEBUG = bool(sys.argv[6]) if len(sys.argv) > 6 else True
-    g = Game(algorithms_names, map_filename, max_rounds, max_elapsed_time, max_depth)
-    g.run()
+    if headless:
+        logger = Logger()
+        try:
+            print(HeadlessGame(algorithms_names, map_filename, max_rounds, max_elapsed_time, max_depth, logger).run())
+        finally:
+            logger.close()
+    else:
+        # pygame and the sprites are imported only for the window, they count towards its first frame
+        from game import Game
+        g = Game(algorithms_names, map_filename, max_rounds, max_elapsed_time, max_depth, start_time=start_time)
+        g.run()
 except (Exception,):
     traceback.print_exc()
     input()
 finally:
-    pygame.display.quit()
-    pygame.quit()
+    if pygame := sys.modules.get('pygame'):
+        pygame.display.quit()
+        pygame.quit()
@@ -0,0 +1,69 @@
+import os
+
+import config
+from state import State
+
+# every map character translated to '1' for the layer it belongs to and '0' otherwise
+ABYSS_TABLE = str.maketrans({char: '1' if char in config.ABYSS_KINDS else '0'
+                             for char in config.FREE_KINDS + config.ABYSS_KINDS +
+                             config.COLOR_KINDS + config.SPACESHIP_KINDS})
+COLOR_TABLES = {kind: str.maketrans({char: '1' if char.lower() == kind else '0'
+                                     for char in config.FREE_KINDS + config.ABYSS_KINDS +
+                                     config.COLOR_KINDS + config.SPACESHIP_KINDS})
+                for kind in config.COLOR_KINDS}
+MAP_CHARS = set(config.FREE_KINDS + config.ABYSS_KINDS + config.COLOR_KINDS + config.SPACESHIP_KINDS)
+
+
+def row_to_mask(line, table):
+    # leftmost character is the lowest bit of the row
+    return int(line.translate(table)[::-1], 2)
+
+
+def read_map_lines(path):
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def load_state(map_name, max_rounds):
+    return parse_map(read_map_lines(os.path.join(config.MAP_FOLDER, map_name)), max_rounds, map_name)
+
+
+def parse_map(lines, max_rounds, map_name='map'):
+    abyss_tiles_positions_int = 0
+    colored_tiles_positions_dict = {}
+    spaceships_positions_dict = {}
+    num_of_rows = 0
+    num_of_cols = None
+
+    for i, line in enumerate(lines):
+        if num_of_cols is None:
+            num_of_cols = len(line)
+        elif len(line) != num_of_cols:
+            raise Exception(f'Line {i} of map has {len(line)} characters instead of {num_of_cols}!')
+        if illegal := set(line) - MAP_CHARS:
+            raise Exception(f'Illegal character {illegal.pop()} in map!')
+
+        shift = i * num_of_cols
+        abyss_tiles_positions_int |= row_to_mask(line, ABYSS_TABLE) << shift
+        for kind, table in COLOR_TABLES.items():
+            if kind in line or kind.upper() in line:
+                colored_tiles_positions_dict[kind] = (colored_tiles_positions_dict.get(kind, 0) |
+                                                      row_to_mask(line, table) << shift)
+        for kind in config.SPACESHIP_KINDS:
+            if kind not in spaceships_positions_dict and (j := line.find(kind)) != -1:
+                spaceships_positions_dict[kind] = 1 << (shift + j)
+        num_of_rows += 1
+
+    if not num_of_rows:
+        raise Exception(f'Map {map_name} is empty!')
+    config.M = num_of_rows
+    config.N = num_of_cols
+    # fixed spaceship and colour order keeps state keys the same however the position was read
+    spaceships_positions_dict = {kind: spaceships_positions_dict[kind] for kind in config.SPACESHIP_KINDS
+                                 if kind in spaceships_positions_dict}
+    colored_tiles_positions_dict = {kind: colored_tiles_positions_dict[kind] for kind in config.COLOR_KINDS
+                                    if kind in colored_tiles_positions_dict}
+    return State(spaceships_positions_dict, colored_tiles_positions_dict, abyss_tiles_positions_int, max_rounds)
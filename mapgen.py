@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+
+import config
+from evaluation import flood_fill, get_board_masks
+from util import popcount
+
+CORPUS_SIZES = [8, 16, 32, 64, 128, 256]
+CORPUS_PLAYERS = [2, 4]
+CORPUS_PIT_RATIO = 0.2
+CORPUS_SEED = 0
+
+
+def generate_map(width, height, pit_ratio=CORPUS_PIT_RATIO, num_of_players=2, seed=None):
+    if not 2 <= num_of_players <= config.MAX_PLAYERS:
+        raise ValueError(f'Number of players must be between 2 and {config.MAX_PLAYERS}!')
+    if not 0 <= pit_ratio < 1:
+        raise ValueError('Pit ratio must be in [0, 1)!')
+    rng = random.Random(seed)
+    config.M, config.N = height, width
+    all_ones_mask, _, _ = get_board_masks(height, width)
+
+    pits = 0
+    for idx in rng.sample(range(width * height), int(pit_ratio * width * height)):
+        pits |= 1 << idx
+
+    # keep the largest connected area, smaller ones are filled with pits
+    largest = 0
+    remaining = ~pits & all_ones_mask
+    while remaining:
+        region = flood_fill(remaining & -remaining, remaining)
+        if popcount(region) > popcount(largest):
+            largest = region
+        remaining &= ~region
+    if popcount(largest) < 2 * num_of_players:
+        raise ValueError(f'Pit ratio {pit_ratio} leaves no room for {num_of_players} spaceships!')
+
+    chars = list(format(largest, f'0{width * height}b')[::-1].translate(str.maketrans('01', '0_')))
+    free_tiles = [idx for idx, char in enumerate(chars) if char == '_']
+    for kind, idx in zip(config.SPACESHIP_KINDS, rng.sample(free_tiles, num_of_players)):
+        chars[idx] = kind
+    return [''.join(chars[i * width:(i + 1) * width]) for i in range(height)]
+
+
+def map_name(width, height, pit_ratio, num_of_players, seed):
+    return f'{height}x{width}_p{num_of_players}_r{round(pit_ratio * 100):02d}_s{seed}.txt'
+
+
+def write_map(lines, path):
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def generate_corpus(folder=config.GENERATED_MAP_FOLDER):
+    if not os.path.exists(folder):
+        os.mkdir(folder)
+    paths = []
+    for size in CORPUS_SIZES:
+        for num_of_players in CORPUS_PLAYERS:
+            lines = generate_map(size, size, CORPUS_PIT_RATIO, num_of_players, CORPUS_SEED)
+            path = os.path.join(folder, map_name(size, size, CORPUS_PIT_RATIO, num_of_players, CORPUS_SEED))
+            write_map(lines, path)
+            paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate connected Pynther maps.')
+    parser.add_argument('width', type=int, nargs='?')
+    parser.add_argument('height', type=int, nargs='?')
+    parser.add_argument('--pits', type=float, default=CORPUS_PIT_RATIO, help='ratio of pit tiles')
+    parser.add_argument('--players', type=int, default=2, help='number of spaceships (2-4)')
+    parser.add_argument('--seed', type=int, default=CORPUS_SEED)
+    parser.add_argument('--out', help='output file (default: maps/generated/<generated name>)')
+    parser.add_argument('--corpus', action='store_true', help='regenerate the benchmark corpus')
+    args = parser.parse_args()
+
+    if args.corpus:
+        for corpus_path in generate_corpus():
+            print(corpus_path)
+    elif args.width and args.height:
+        out = args.out or os.path.join(config.GENERATED_MAP_FOLDER,
+                                       map_name(args.width, args.height, args.pits, args.players, args.seed))
+        write_map(generate_map(args.width, args.height, args.pits, args.players, args.seed), out)
+        print(out)
+    else:
+        parser.error('width and height are required unless --corpus is given')
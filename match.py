@@ -0,0 +1,91 @@
+import argparse
+import random
+
+from agents import create_agents
+from headless import HeadlessGame
+from map_loader import load_state
+
+# selective search switches of the two-player agents
+FEATURES = {'lmr': 'late_move_reductions', 'futility': 'futility_pruning', 'stay': 'stay_reduction'}
+
+
+def create_variant(agent_name, features):
+    agent = create_agents([agent_name], 1)[0]
+    for feature, attribute in FEATURES.items():
+        setattr(agent, attribute, feature in features)
+    return agent
+
+
+def play_opening(state, plies, seed):
+    rng = random.Random(seed)
+    for _ in range(plies):
+        if state.is_goal_state():
+            break
+        state = state.generate_successor_state(rng.choice(state.get_legal_actions()))
+    return state
+
+
+def depth_at_time(agent, state, budget, max_depth):
+    # deepest fixed-depth search that finishes within the budget
+    reached = 0
+    for depth in range(1, min(max_depth, state.get_plies_left()) + 1):
+        agent.new_game()
+        agent.choose(state, depth)
+        if agent.stats.total_time > budget:
+            break
+        reached = depth
+    return reached
+
+
+def play_game(agents, map_name, max_rounds, max_depth, opening_plies, seed):
+    game = HeadlessGame(None, map_name, max_rounds, 0, max_depth, agents=agents)
+    game.state = play_opening(game.state, opening_plies, seed)
+    return game.run()
+
+
+def run_match(agent_name, features, map_names, games, max_rounds, max_depth, opening_plies, budget, max_budget_depth):
+    # the selective variant against the same agent without reductions, with both seats for every opening
+    selective, full = create_variant(agent_name, features), create_variant(agent_name, [])
+    wins = draws = losses = 0
+    for map_name in map_names:
+        margins = []
+        for seed in range(games):
+            for agents in [(selective, full), (full, selective)]:
+                scores = play_game(list(agents), map_name, max_rounds, max_depth, opening_plies, seed)
+                selective_chr = chr(ord('A') + agents.index(selective))
+                full_chr = chr(ord('A') + agents.index(full))
+                margin = scores[selective_chr] - scores[full_chr]
+                margins.append(margin)
+                wins += margin > 0
+                draws += margin == 0
+                losses += margin < 0
+
+        depths = {'selective': [], 'full': []}
+        for seed in range(games):
+            state = play_opening(load_state(map_name, max_rounds), opening_plies, seed)
+            depths['selective'].append(depth_at_time(selective, state, budget, max_budget_depth))
+            depths['full'].append(depth_at_time(full, state, budget, max_budget_depth))
+        print(f'{map_name}: mean score margin {sum(margins) / len(margins):+.2f}, depth in {budget}s '
+              f'{sum(depths["selective"]) / games:.1f} (selective) vs {sum(depths["full"]) / games:.1f} (full)')
+    print(f'{agent_name} with {",".join(features) or "nothing"} against full width: '
+          f'{wins} wins, {draws} draws, {losses} losses')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play an agent with selective search against the full-width one.')
+    parser.add_argument('agent', nargs='?', default='NegamaxABAgent')
+    parser.add_argument('--features', default=','.join(FEATURES), help=f'comma separated: {list(FEATURES)}')
+    parser.add_argument('--maps', default='example_map.txt,generated/8x8_p2_r20_s0.txt')
+    parser.add_argument('--games', type=int, default=4, help='openings per map, each is played from both seats')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--opening', type=int, default=2, help='random plies before the agents take over')
+    parser.add_argument('--time', type=float, default=0.5, help='budget for the depth reached')
+    parser.add_argument('--max-depth', type=int, default=10)
+    args = parser.parse_args()
+
+    chosen = [feature for feature in args.features.split(',') if feature]
+    if unknown := set(chosen) - set(FEATURES):
+        parser.error(f'unknown feature {unknown.pop()}')
+    run_match(args.agent, chosen, args.maps.split(','), args.games, args.rounds, args.depth, args.opening,
+              args.time, args.max_depth)
@@ -0,0 +1,161 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from multiprocessing import RawArray
+
+import config
+import evaluation
+from agents import create_agents
+from state import MapDescriptor, State
+from timecontrol import Deadline
+
+# one pool for every pondering agent, on the spare cores, with a stop flag per running search
+STOP_SLOTS = 256
+executor = None
+users = 0
+stop_flags = None
+next_slot = 0
+
+
+def init_worker(flags):
+    global stop_flags
+    stop_flags = flags
+
+
+class PonderDeadline(Deadline):
+    # no time limit, the search deepens until the game process raises its flag
+    def __init__(self, slot):
+        super().__init__(math.inf, math.inf)
+        self.slot = slot
+
+    def soft_expired(self):
+        return stop_flags[self.slot] != 0
+
+    def hard_expired(self):
+        return stop_flags[self.slot] != 0
+
+
+def ponder_position(agent_name, descriptor_data, state_data, max_depth, slot, table_name=None):
+    # positions travel as binary records, the map descriptor is a few bytes more;
+    # returns the move and the depth of the deepest finished iteration
+    state = State.from_bytes(state_data, MapDescriptor.from_bytes(descriptor_data).register())
+    agent = create_agents([agent_name], 1)[0]
+    deadline = PonderDeadline(slot)
+    if table_name:
+        # the search lands in the shared table directly, nothing has to be sent back
+        agent.attach_shared_table(table_name)
+        try:
+            return agent.choose(state, max_depth, deadline), {}, agent.stats.depth
+        finally:
+            agent.close()
+    action = agent.choose(state, max_depth, deadline)
+    depth = agent.stats.depth
+    # only the top of the searched tree is sent back, deeper entries are cheap to recompute
+    entries = {key: entry for key, entry in agent.transposition_table.items()
+               if entry[0] >= depth - config.PONDER_TT_PLIES}
+    return action, entries, depth
+
+
+def get_executor():
+    global executor, stop_flags
+    if executor is None:
+        stop_flags = RawArray('b', STOP_SLOTS)
+        executor = ProcessPoolExecutor(max_workers=config.PONDER_WORKERS or max(1, os.cpu_count() - 1),
+                                       initializer=init_worker, initargs=(stop_flags,))
+    return executor
+
+
+def get_slot():
+    global next_slot
+    slot = next_slot
+    next_slot = (next_slot + 1) % STOP_SLOTS
+    stop_flags[slot] = 0
+    return slot
+
+
+class Ponderer:
+    def __init__(self, agent):
+        global users
+        users += 1
+        self.agent = agent
+        self.agent_name = type(agent).__name__
+        self.futures = {}
+
+    @staticmethod
+    def predicted_positions(state, player_ord):
+        # positions where player_ord is on move next, most likely replies first
+        frontier = [state]
+        while frontier and frontier[0].get_on_move_ord() != player_ord:
+            ranked = []
+            for node in frontier:
+                if node.is_goal_state():
+                    continue
+                mover = node.get_on_move_chr()
+                replies = [node.generate_successor_state(action) for action in node.get_legal_actions()]
+                replies.sort(key=lambda reply: -evaluation.estimated_scores(reply)[mover])
+                ranked.extend(enumerate(replies))
+            ranked.sort(key=lambda item: item[0])
+            frontier = [reply for _, reply in ranked[:config.PONDER_MAX_POSITIONS]]
+        return frontier
+
+    def start(self, state, player_ord, max_depth):
+        self.cancel()
+        pool = get_executor()
+        descriptor = state.get_descriptor()
+        descriptor_data = descriptor.to_bytes()
+        for position in self.predicted_positions(state, player_ord):
+            if not position.is_goal_state():
+                slot = get_slot()
+                future = pool.submit(ponder_position, self.agent_name, descriptor_data, position.to_bytes(descriptor),
+                                     max_depth, slot, self.agent.get_shared_table_name())
+                self.futures[position.get_key()] = (future, max_depth, slot)
+
+    def take(self, state, max_depth, deadline=None):
+        future, depth, slot = self.futures.pop(state.get_key(), (None, 0, None))
+        self.cancel()
+        if future is None:
+            return None
+        if depth < max_depth or not (future.running() or future.done()):
+            self.stop(future, slot)
+            return None
+        # the matching search is already under way: it runs until the soft deadline, then it is stopped
+        # and answers with its deepest finished iteration before the hard one
+        if deadline is None or deadline.hard is None:
+            stop_time = answer_time = None
+        else:
+            answer_time = deadline.hard - config.DEADLINE_MARGIN
+            stop_time = min(deadline.soft, answer_time - config.DEADLINE_MARGIN)
+        try:
+            return future.result(timeout=get_time_left(deadline, stop_time))
+        except TimeoutError:
+            stop_flags[slot] = 1
+        except Exception:
+            return None
+        try:
+            return future.result(timeout=get_time_left(deadline, answer_time))
+        except Exception:
+            return None
+
+    def stop(self, future, slot):
+        # a queued search never starts, a running one ends at its next node
+        if not future.cancel():
+            stop_flags[slot] = 1
+
+    def cancel(self):
+        for future, _, slot in self.futures.values():
+            self.stop(future, slot)
+        self.futures = {}
+
+    def close(self):
+        global executor, users
+        self.cancel()
+        users -= 1
+        if users == 0 and executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = None
+
+
+def get_time_left(deadline, limit):
+    if limit is None:
+        return None
+    return max(0.0, limit - deadline.get_elapsed())
@@ -0,0 +1,180 @@
+import argparse
+import random
+import struct
+import time
+import tracemalloc
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import config
+
+MASK64 = (1 << 64) - 1
+# an entry is three 64-bit words: the checked key, the value (float64) and depth | bound | move;
+# the key is stored xor-ed with the data words, so a torn write from another process reads as a miss
+WORDS_PER_ENTRY = 3
+ENTRY_SIZE = 8 * WORDS_PER_ENTRY
+DEPTH_BITS = 16
+BOUND_BITS = 4
+COORD_BITS = 10  # rows and columns of the move, independent of the board size
+COORD_MASK = (1 << COORD_BITS) - 1
+MOVE_SHIFT = DEPTH_BITS + BOUND_BITS
+ENTRY = struct.Struct('<3Q')
+WORD = struct.Struct('<Q')
+DOUBLE = struct.Struct('<d')
+
+
+class SharedTranspositionTable:
+    def __init__(self, memory, owner):
+        self.memory = memory
+        self.owner = owner
+        self.words = memory.buf.cast('Q')
+        self.size = len(self.words) // WORDS_PER_ENTRY
+        self.mask = self.size - 1
+        # moves decoded so far by their bits, probes build no new tuples for them
+        self.moves = {}
+        self.read_entry = ENTRY.unpack_from
+        self.pack_bits = WORD.pack
+        self.unpack_value = DOUBLE.unpack
+        self.misses = 0
+        self.hits = 0
+        self.collisions = 0
+        self.writes = 0
+        self.overwrites = 0
+
+    @classmethod
+    def create(cls, entries=None, name=None):
+        size = 1 << max(1, ((entries or config.SHARED_TT_ENTRIES) - 1).bit_length())
+        return cls(SharedMemory(name=name, create=True, size=size * ENTRY_SIZE), True)
+
+    @classmethod
+    def attach(cls, name):
+        memory = SharedMemory(name=name)
+        # only the creator removes the block, the resource tracker would remove it when this process exits
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        return cls(memory, False)
+
+    def get_name(self):
+        return self.memory.name
+
+    @staticmethod
+    def get_hash(key):
+        return hash(key) & MASK64 or 1
+
+    @staticmethod
+    def encode_move(move):
+        (src_row, src_col), (dst_row, dst_col) = move
+        return src_row | src_col << COORD_BITS | dst_row << 2 * COORD_BITS | dst_col << 3 * COORD_BITS
+
+    def decode_move(self, bits):
+        move = self.moves[bits] = ((bits & COORD_MASK, bits >> COORD_BITS & COORD_MASK),
+                                   (bits >> 2 * COORD_BITS & COORD_MASK, bits >> 3 * COORD_BITS))
+        return move
+
+    def get(self, key, default=None):
+        h = hash(key) & MASK64 or 1
+        # the three words are read once, the value that passed the check is the one returned
+        stored, value_bits, data = self.read_entry(self.words, (h & self.mask) * ENTRY_SIZE)
+        if stored ^ value_bits ^ data != h:
+            if stored:
+                self.collisions += 1
+            else:
+                self.misses += 1
+            return default
+        self.hits += 1
+        bits = data >> MOVE_SHIFT
+        return (data & 0xFFFF, data >> DEPTH_BITS & 0xF, self.unpack_value(self.pack_bits(value_bits))[0],
+                self.moves.get(bits) or self.decode_move(bits))
+
+    def __getitem__(self, key):
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, entry):
+        # lossy: the slot always takes the newest entry
+        depth, bound, value, move = entry
+        h = self.get_hash(key)
+        slot = (h & self.mask) * WORDS_PER_ENTRY
+        words = self.words
+        if (stored := words[slot]) and stored ^ words[slot + 1] ^ words[slot + 2] != h:
+            self.overwrites += 1
+        self.writes += 1
+        value_bits = WORD.unpack(DOUBLE.pack(value))[0]
+        data = depth | bound << DEPTH_BITS | self.encode_move(move) << MOVE_SHIFT
+        words[slot + 1] = value_bits
+        words[slot + 2] = data
+        words[slot] = h ^ value_bits ^ data
+
+    def clear(self):
+        self.memory.buf[:] = bytes(len(self.memory.buf))
+
+    def get_occupancy(self):
+        return sum(1 for stored in self.words[::WORDS_PER_ENTRY] if stored) / self.size
+
+    def get_probes(self):
+        return self.hits + self.misses + self.collisions
+
+    def __str__(self):
+        probes = self.get_probes()
+        return (f'shared TT {self.get_name()}: {self.size} entries, occupancy {self.get_occupancy() * 100:.1f}%, '
+                f'{probes} probes, hit rate {self.hits / max(1, probes) * 100:.1f}%, '
+                f'collision rate {self.collisions / max(1, probes) * 100:.2f}%, '
+                f'{self.writes} writes, {self.overwrites} overwrites')
+
+    def close(self):
+        self.words.release()
+        self.memory.close()
+        if self.owner:
+            # processes forked from this one share its resource tracker, attaching there unregisters the block
+            resource_tracker.register(self.memory._name, 'shared_memory')
+            self.memory.unlink()
+
+
+def make_key(rng, m, n):
+    return ((1 << rng.randrange(m * n), 1 << rng.randrange(m * n)),
+            (rng.getrandbits(m * n), rng.getrandbits(m * n)), rng.randrange(2), rng.randrange(100))
+
+
+def benchmark(entries, probes, m, n):
+    # the same keys and probes on a dict of Python objects and on the shared table
+    config.M, config.N = m, n
+    rng = random.Random(0)
+    # a dict keeps the keys and entries of the search alive, they count towards its memory
+    tracemalloc.start()
+    entries_to_store = [(make_key(rng, m, n), (rng.randrange(10), rng.randrange(3), rng.random(), ((0, 0), (0, n - 1))))
+                        for _ in range(entries)]
+    table = dict(entries_to_store)
+    dict_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del table
+    # searches build a new key for every node, so the dict cannot match keys by identity
+    lookups = [(tuple(key[0]), tuple(key[1]), key[2], key[3]) for key, _ in
+               (entries_to_store[rng.randrange(entries)] for _ in range(probes))]
+    shared = SharedTranspositionTable.create(2 * entries)
+    print(f'{entries} entries, {probes} probes, {m}x{n} board')
+    for name, table, memory in [('dict', {}, dict_memory), ('shared', shared, ENTRY_SIZE * shared.size)]:
+        start_time = time.perf_counter()
+        for key, entry in entries_to_store:
+            table[key] = entry
+        store_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        for key in lookups:
+            table.get(key)
+        probe_time = time.perf_counter() - start_time
+        print(f'{name:>6}: store {store_time / entries * 1e9:.0f} ns, probe {probe_time / probes * 1e9:.0f} ns, '
+              f'{memory / entries:.0f} bytes per entry')
+    print(shared)
+    shared.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the shared transposition table with a dict.')
+    parser.add_argument('--entries', type=int, default=1 << 18)
+    parser.add_argument('--probes', type=int, default=1_000_000)
+    parser.add_argument('--size', type=int, default=8, help='board side')
+    args = parser.parse_args()
+    benchmark(args.entries, args.probes, args.size, args.size)
@@ -0,0 +1,80 @@
+import multiprocessing
+import signal
+import time
+import traceback
+from queue import Empty
+
+import config
+from headless import HeadlessGame
+from util import Timeout, Logger
+
+# settings that can be changed from the command line, the simulation process may not inherit them
+SHARED_CONFIG = ['DEBUG', 'PONDER', 'PROFILER', 'RECORD', 'SHARED_TT_ENTRIES', 'TIME_BANK', 'TIME_INCREMENT',
+                 'WORKERS']
+
+
+def run_simulation(settings, game_args, transitions, playing, stopped):
+    # a forked process inherits the SDL handler, which turns SIGTERM into a quit event
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for name, value in settings.items():
+        setattr(config, name, value)
+    logger = Logger('SIMULATION') if config.PROFILER else None
+    game = None
+    try:
+        game = HeadlessGame(*game_args, logger=logger)
+        game.start_pondering()
+        while not game.state.is_goal_state():
+            playing.wait()
+            if stopped.is_set():
+                break
+            transitions.put(game.step())
+    except Timeout:
+        transitions.put(f'Agent {game.state.get_on_move_chr()} ran out of time ({game.deadline})!')
+    except Exception:
+        transitions.put(traceback.format_exc())
+    finally:
+        if game:
+            game.close()
+        if logger:
+            logger.close()
+
+
+class Simulation:
+    # state, agents and time control in their own process, transitions are published to the render loop
+    def __init__(self, algorithms_names, map_name, max_rounds, max_think_time, max_depth):
+        self.transitions = multiprocessing.Queue(config.TRANSITION_BUFFER)
+        self.playing = multiprocessing.Event()
+        self.stopped = multiprocessing.Event()
+        settings = {name: getattr(config, name) for name in SHARED_CONFIG}
+        game_args = (algorithms_names, map_name, max_rounds, max_think_time, max_depth)
+        self.process = multiprocessing.Process(target=run_simulation,
+                                               args=(settings, game_args, self.transitions,
+                                                     self.playing, self.stopped))
+
+    def start(self):
+        self.process.start()
+
+    def set_playing(self, playing):
+        if playing:
+            self.playing.set()
+        else:
+            self.playing.clear()
+
+    def poll(self):
+        # a transition, an error message or None when the next move is not ready yet
+        try:
+            return self.transitions.get_nowait()
+        except Empty:
+            return None
+
+    def close(self):
+        self.stopped.set()
+        self.playing.set()
+        end_time = time.time() + config.SIMULATION_CLOSE_TIMEOUT
+        while self.process.is_alive() and time.time() < end_time:
+            # unblocks a pending put of the simulation process
+            self.poll()
+            self.process.join(config.SLEEP_TIME * 10)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
@@ -1,4 +1,6 @@
+import hashlib
 import os
+import time
 from random import randint
 
 import pygame
@@ -6,22 +8,61 @@ import pygame
 import config
 
 
-class BaseSprite(pygame.sprite.Sprite):
-    images_dict = {}
+class Atlas:
+    # every image of img/ scaled to one size, side by side on a single surface that is cached on disk,
+    # so a window at a known tile size loads all of them in one call
+    atlases = {}
+
+    def __init__(self, size):
+        start_time = time.perf_counter()
+        names = sorted(name for name in os.listdir(config.IMG_FOLDER) if name.endswith('.png'))
+        path = self.get_cache_path(names, size)
+        self.cached = os.path.exists(path)
+        if self.cached:
+            surface = pygame.image.load(path)
+        else:
+            surface = pygame.Surface((size[0] * len(names), size[1]))
+            for i, name in enumerate(names):
+                image = pygame.image.load(os.path.join(config.IMG_FOLDER, name))
+                surface.blit(pygame.transform.scale(image, size), (i * size[0], 0))
+            os.makedirs(config.CACHE_FOLDER, exist_ok=True)
+            pygame.image.save(surface, path)
+        surface = surface.convert()
+        surface.set_colorkey(config.WHITE)
+        # subsurfaces share the pixels and the colour key of the atlas
+        self.images = {name: surface.subsurface((i * size[0], 0, size[0], size[1])) for i, name in enumerate(names)}
+        self.size = size
+        self.load_time = time.perf_counter() - start_time
+
+    @staticmethod
+    def get_cache_path(names, size):
+        # keyed by the contents of the images, a changed image gets a new atlas whatever its size and time stamp
+        signature = hashlib.blake2b(digest_size=8)
+        for name in names:
+            with open(os.path.join(config.IMG_FOLDER, name), 'rb') as file:
+                data = file.read()
+            signature.update(f'{name} {len(data)};'.encode())
+            signature.update(data)
+        return os.path.join(config.CACHE_FOLDER, f'atlas_{size[0]}x{size[1]}_{signature.hexdigest()}.png')
+
+    @classmethod
+    def get(cls, size):
+        if size not in cls.atlases:
+            cls.atlases[size] = cls(size)
+        return cls.atlases[size]
 
+    def __str__(self):
+        return (f'atlas of {len(self.images)} images at {self.size[0]}x{self.size[1]} '
+                f'{"loaded from cache" if self.cached else "built"} in {self.load_time:.3f}s')
+
+
+class BaseSprite(pygame.sprite.Sprite):
     def __init__(self, position, size, kind, image_name=None, offset=(0, 0)):
         super().__init__()
         self.kind = kind
         if image_name is None:
             image_name = f'{self.__class__.__name__.lower()}.png'
-        if image_name in BaseSprite.images_dict:
-            image = BaseSprite.images_dict[image_name]
-        else:
-            image = pygame.image.load(os.path.join(config.IMG_FOLDER, image_name)).convert()
-            image = pygame.transform.scale(image, size)
-            image.set_colorkey(config.WHITE)
-            BaseSprite.images_dict[image_name] = image
-        self.image = image.copy()
+        self.image = Atlas.get(size).images[image_name].copy()
         self.rect = self.image.get_rect()
         self.rect.topleft = (position[1] * config.TILE_SIZE + offset[1], position[0] * config.TILE_SIZE + offset[0])
 
@@ -41,25 +82,16 @@ class Spaceship(BaseSprite):
         super().__init__(position, (config.TILE_SIZE, config.TILE_SIZE),
                          kind, f'{self.__class__.__name__.lower()}_{spaceship_name}.png')
 
-    def move_towards(self, destination):
-        dy = destination[0] * config.TILE_SIZE - self.rect.y
-        dx = destination[1] * config.TILE_SIZE - self.rect.x
-
-        if abs(dy) > config.TILE_OFFSET:
-            self.rect.y += config.TILE_OFFSET if dy > 0 else -config.TILE_OFFSET
-        elif abs(dx) > config.TILE_OFFSET:
-            self.rect.x += config.TILE_OFFSET if dx > 0 else -config.TILE_OFFSET
-        else:
-            self.rect.y, self.rect.x = destination[0] * config.TILE_SIZE, destination[1] * config.TILE_SIZE
-            return False
-        return True
+    def place_between(self, source, destination, fraction):
+        self.rect.y = round((source[0] + (destination[0] - source[0]) * fraction) * config.TILE_SIZE)
+        self.rect.x = round((source[1] + (destination[1] - source[1]) * fraction) * config.TILE_SIZE)
 
     def place_to(self, destination):
         self.rect.y, self.rect.x = destination[0] * config.TILE_SIZE, destination[1] * config.TILE_SIZE
 
     @classmethod
     def kinds(cls):
-        return ['A', 'B', 'C', 'D']
+        return config.SPACESHIP_KINDS
 
     @staticmethod
     def colors():
@@ -81,7 +113,7 @@ class ColoredTile(BaseSprite):
 
     @classmethod
     def kinds(cls):
-        return ['a', 'b', 'c', 'd']
+        return config.COLOR_KINDS
 
 
 class AbyssTile(BaseSprite):
@@ -93,7 +125,7 @@ class AbyssTile(BaseSprite):
 
     @classmethod
     def kinds(cls):
-        return ['0']
+        return config.ABYSS_KINDS
 
 
 class FreeTile(BaseSprite):
@@ -102,4 +134,4 @@ class FreeTile(BaseSprite):
 
     @classmethod
     def kinds(cls):
-        return ['_']
+        return config.FREE_KINDS
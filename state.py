@@ -28,13 +28,99 @@ _ _ _ _ 0 b B    0 0 0 0 1 1 1    0 0 0 0 0 0 0     0 0 0 0 0 1 1    0 0 0 0 1 0
 A position = 2^16
 B position = 2^41
 
+Besides the bitboards, every state carries running per-player scores,
+the occupancy mask (STATE_binary_ above) and the number of free tiles.
+A move only changes the painted segment, so the successor updates these
+from the segment delta and scores and goal checks are plain field reads.
+The children of a state are built with iter_expand (lazily, for searches
+that cut off) or expand, which work out the mover once for all siblings;
+generate_successor_state is the checked single-move form of the same.
+
+BINARY FORMAT
+Between processes and in files a state is a fixed-size record of the
+bitboards that change during a game; everything else is in the map
+descriptor (size, pits, kinds, max rounds), which is sent once and
+referred to by its 64-bit id:
+map id (8 bytes) | round (2) | on move (1) | spaceship cells (2 or 4 each) |
+colours (ceil(M * N / 8) bytes each, little endian)
+All records of a map have the same size, so many states pack into one
+contiguous buffer (pack_states) and unpack from any slice of it.
+
 """
-import copy
+import functools
+import hashlib
 import math
+import struct
 from collections import Counter
 
 import config
-from sprites import Spaceship, AbyssTile, ColoredTile
+from util import popcount
+
+
+STATE_HEADER = struct.Struct('<QHB')
+DESCRIPTOR_HEADER = struct.Struct('<IIHBB')
+# descriptors of the maps whose states this process can decode, by map id
+DESCRIPTORS = {}
+
+
+class MapDescriptor:
+    def __init__(self, m, n, abyss_tiles_positions_int, spaceship_kinds, color_kinds, max_rounds):
+        self.m = m
+        self.n = n
+        self.abyss_tiles_positions_int = abyss_tiles_positions_int
+        self.spaceship_kinds = spaceship_kinds
+        self.color_kinds = color_kinds
+        self.max_rounds = max_rounds
+        self.board_bytes = (m * n + 7) // 8
+        self.cells = struct.Struct('<' + ('H' if m * n <= 1 << 16 else 'I') * len(spaceship_kinds))
+        self.record_size = STATE_HEADER.size + self.cells.size + len(color_kinds) * self.board_bytes
+        self.map_id = int.from_bytes(hashlib.blake2b(self.to_bytes(), digest_size=8).digest(), 'little')
+
+    def to_bytes(self):
+        return (DESCRIPTOR_HEADER.pack(self.m, self.n, self.max_rounds, len(self.spaceship_kinds),
+                                       len(self.color_kinds)) +
+                ''.join(self.spaceship_kinds + self.color_kinds).encode() +
+                self.abyss_tiles_positions_int.to_bytes(self.board_bytes, 'little'))
+
+    @classmethod
+    def from_bytes(cls, data):
+        m, n, max_rounds, num_of_spaceships, num_of_colors = DESCRIPTOR_HEADER.unpack_from(data)
+        offset = DESCRIPTOR_HEADER.size
+        kinds = bytes(data[offset:offset + num_of_spaceships + num_of_colors]).decode()
+        offset += len(kinds)
+        abyss = int.from_bytes(data[offset:offset + (m * n + 7) // 8], 'little')
+        return cls(m, n, abyss, tuple(kinds[:num_of_spaceships]), tuple(kinds[num_of_spaceships:]), max_rounds)
+
+    def register(self):
+        # decoding builds states of this map, which needs its size in config like loading it does
+        DESCRIPTORS[self.map_id] = self
+        config.M, config.N = self.m, self.n
+        return self
+
+
+@functools.lru_cache(maxsize=16)
+def get_descriptor(m, n, abyss_tiles_positions_int, spaceship_kinds, color_kinds, max_rounds):
+    descriptor = MapDescriptor(m, n, abyss_tiles_positions_int, spaceship_kinds, color_kinds, max_rounds)
+    DESCRIPTORS[descriptor.map_id] = descriptor
+    return descriptor
+
+
+def pack_states(states, descriptor=None):
+    # one contiguous buffer of fixed-size records, all states of the same map
+    descriptor = descriptor or states[0].get_descriptor()
+    buffer = bytearray(descriptor.record_size * len(states))
+    for i, state in enumerate(states):
+        state.write_bytes(buffer, i * descriptor.record_size, descriptor)
+    return buffer
+
+
+def unpack_states(buffer, descriptor=None):
+    view = memoryview(buffer)
+    if not view:
+        return []
+    descriptor = descriptor or State.find_descriptor(view)
+    size = descriptor.record_size
+    return [State.from_bytes(view[offset:offset + size], descriptor) for offset in range(0, len(view), size)]
 
 
 class State:
@@ -49,43 +135,97 @@ class State:
         self.legal_actions = {}
         self.max_rounds = max_rounds
         self.current_round = 0
+        self.scores = {kind: popcount(color) for kind, color in colored_tiles_positions_dict.items()}
+        self.occupied = abyss_tiles_positions_int
+        for position in spaceships_positions_dict.values():
+            self.occupied |= position
+        for color in colored_tiles_positions_dict.values():
+            self.occupied |= color
+        self.free_count = popcount(self.all_ones_mask & ~self.occupied)
 
     def __str__(self):
+        return '\n'.join(' '.join(line) for line in self.get_map_lines())
+
+    def get_map_lines(self):
+        # the same characters as in map files, ships stand on their own colour; every colour is written,
+        # also one whose ship is not on the map, so the lines parse back to the same state
         char_matrix = [['_'] * config.N for _ in range(config.M)]
-        for i in range(config.M):
-            for j in range(config.N):
-                mask_set_bit = 1 << (i * config.N + j)
-                for kind, position in self.spaceships_positions_dict.items():
-                    if mask_set_bit == position:
-                        char_matrix[i][j] = kind
-                        break
-                    elif kind.lower() in self.colored_tiles_positions_dict and (
-                            mask_set_bit & self.colored_tiles_positions_dict[kind.lower()]):
-                        char_matrix[i][j] = kind.lower()
-                        break
-                else:
-                    if mask_set_bit & self.abyss_tiles_positions_int:
-                        char_matrix[i][j] = '0'
-        return '\n'.join(' '.join(row) for row in char_matrix)
+        layers = [(kind, color) for kind, color in self.colored_tiles_positions_dict.items()]
+        layers += [(kind, position) for kind, position in self.spaceships_positions_dict.items()]
+        layers.append(('0', self.abyss_tiles_positions_int))
+        for kind, mask in layers:
+            while mask:
+                low = mask & -mask
+                i, j = divmod(low.bit_length() - 1, config.N)
+                char_matrix[i][j] = kind
+                mask ^= low
+        return [''.join(row) for row in char_matrix]
 
     def __eq__(self, other):
         if not isinstance(other, State):
             return False
-        return (self.get_state(Spaceship.kinds()) == other.get_state(Spaceship.kinds()) and
-                self.get_state(ColoredTile.kinds()) == other.get_state(ColoredTile.kinds()) and
-                self.get_state(AbyssTile.kinds()) == other.get_state(AbyssTile.kinds()) and
-                self.on_move == other.on_move)
+        return self.get_key() == other.get_key() and self.abyss_tiles_positions_int == other.abyss_tiles_positions_int
 
     def __hash__(self):
-        return hash((
-            self.get_state(Spaceship.kinds()),
-            self.get_state(ColoredTile.kinds()),
-            self.get_state(AbyssTile.kinds()),
-            self.on_move
-        ))
+        return hash(self.get_key())
+
+    def get_key(self):
+        # identifies the position within one game (the pits never change)
+        return (tuple(self.spaceships_positions_dict.values()),
+                tuple(self.colored_tiles_positions_dict.values()),
+                self.on_move,
+                self.current_round)
 
     def __lt__(self, other):
-        return self.get_state(Spaceship.kinds()) < other.get_state(Spaceship.kinds())
+        return self.get_state(config.SPACESHIP_KINDS) < other.get_state(config.SPACESHIP_KINDS)
+
+    def get_descriptor(self):
+        return get_descriptor(config.M, config.N, self.abyss_tiles_positions_int,
+                              tuple(self.spaceships_positions_dict), tuple(self.colored_tiles_positions_dict),
+                              self.max_rounds)
+
+    def write_bytes(self, buffer, offset, descriptor):
+        STATE_HEADER.pack_into(buffer, offset, descriptor.map_id, self.current_round, self.on_move)
+        offset += STATE_HEADER.size
+        descriptor.cells.pack_into(buffer, offset,
+                                   *(position.bit_length() - 1 for position in self.spaceships_positions_dict.values()))
+        offset += descriptor.cells.size
+        board_bytes = descriptor.board_bytes
+        for color in self.colored_tiles_positions_dict.values():
+            buffer[offset:offset + board_bytes] = color.to_bytes(board_bytes, 'little')
+            offset += board_bytes
+
+    def to_bytes(self, descriptor=None):
+        descriptor = descriptor or self.get_descriptor()
+        buffer = bytearray(descriptor.record_size)
+        self.write_bytes(buffer, 0, descriptor)
+        return bytes(buffer)
+
+    @staticmethod
+    def find_descriptor(data):
+        map_id = STATE_HEADER.unpack_from(data)[0]
+        if map_id not in DESCRIPTORS:
+            raise ValueError(f'ERROR: Unknown map id {map_id:016x}, its descriptor was not registered!')
+        return DESCRIPTORS[map_id]
+
+    @classmethod
+    def from_bytes(cls, data, descriptor=None):
+        descriptor = descriptor or cls.find_descriptor(data)
+        map_id, current_round, on_move = STATE_HEADER.unpack_from(data)
+        if map_id != descriptor.map_id:
+            raise ValueError(f'ERROR: State of map {map_id:016x} decoded with map {descriptor.map_id:016x}!')
+        offset = STATE_HEADER.size
+        cells = descriptor.cells.unpack_from(data, offset)
+        offset += descriptor.cells.size
+        board_bytes = descriptor.board_bytes
+        colors = [int.from_bytes(data[start:start + board_bytes], 'little')
+                  for start in range(offset, offset + len(descriptor.color_kinds) * board_bytes, board_bytes)]
+        state = cls(dict(zip(descriptor.spaceship_kinds, (1 << cell for cell in cells))),
+                    dict(zip(descriptor.color_kinds, colors)), descriptor.abyss_tiles_positions_int,
+                    descriptor.max_rounds)
+        state.current_round = current_round
+        state.on_move = on_move
+        return state
 
     def get_num_of_players(self):
         return self.num_of_players
@@ -96,26 +236,21 @@ class State:
     def get_max_rounds(self):
         return self.max_rounds
 
+    def get_plies_left(self):
+        return (self.max_rounds - self.current_round) * self.num_of_players - self.on_move
+
     def get_scores(self):
-        result = {}
-        for kind, color in self.colored_tiles_positions_dict.items():
-            result[kind.upper()] = self.get_score(kind)
-        return result
+        return {kind.upper(): score for kind, score in self.scores.items()}
 
     def get_score(self, kind):
-        color = self.colored_tiles_positions_dict[kind.lower()]
-        score = color.bit_count() if hasattr(color, 'bit_count') else bin(color).count('1')
-        return score
+        return self.scores[kind.lower()]
+
+    def get_free_count(self):
+        return self.free_count
 
     def get_state(self, kind=None):
         if kind is None:
-            state = 0
-            for val in self.spaceships_positions_dict.values():
-                state |= val
-            for val in self.colored_tiles_positions_dict.values():
-                state |= val
-            state |= self.abyss_tiles_positions_int
-            return state
+            return self.occupied
         elif type(kind) is list and Counter(kind) == Counter(self.spaceships_positions_dict.keys()):
             state = 0
             for val in self.spaceships_positions_dict.values():
@@ -126,16 +261,16 @@ class State:
             for val in self.colored_tiles_positions_dict.values():
                 state |= val
             return state
-        elif kind in Spaceship.kinds():
+        elif kind in config.SPACESHIP_KINDS:
             return self.spaceships_positions_dict[kind]
-        elif kind in ColoredTile.kinds():
+        elif kind in config.COLOR_KINDS:
             return self.colored_tiles_positions_dict[kind]
-        elif kind in AbyssTile.kinds():
+        elif kind in config.ABYSS_KINDS:
             return self.abyss_tiles_positions_int
         raise ValueError(f'ERROR: No such kind: {kind}')
 
     def is_goal_state(self):
-        return (self.get_state() == self.all_ones_mask) or (self.current_round == self.max_rounds)
+        return self.free_count == 0 or self.current_round == self.max_rounds
 
     @staticmethod
     def get_action_cost(action):
@@ -230,60 +365,69 @@ class State:
     def get_on_move_chr(self):
         return chr(ord('A') + self.on_move)
 
-    def move_to_next_player(self):
-        self.on_move = (self.on_move + 1) % self.num_of_players
-        if self.on_move == 0:
-            self.current_round += 1
+    def paint(self, kind, segment):
+        # only the painted segment changes, scores and occupancy are updated by its delta
+        colors = self.colored_tiles_positions_dict
+        gained = segment & ~colors[kind]
+        if gained:
+            self.scores = self.scores.copy()
+            colors[kind] |= segment
+            self.scores[kind] += popcount(gained)
+            for key, color in colors.items():
+                if key != kind and (stolen := color & gained):
+                    colors[key] = color & ~stolen
+                    self.scores[key] -= popcount(stolen)
+            self.free_count -= popcount(gained & ~self.occupied)
+            self.occupied |= gained
 
-    def generate_successor_state(self, action):
+    @staticmethod
+    def get_segment(src, dst):
+        # the tiles a move paints, both ends included
+        n = config.N
+        if src[1] == dst[1]:
+            low, high = min(src[0], dst[0]), max(src[0], dst[0])
+            return sum(1 << (row * n + src[1]) for row in range(low, high + 1))
+        low, high = min(src[1], dst[1]), max(src[1], dst[1])
+        return ((1 << (high - low + 1)) - 1) << (src[0] * n + low)
+
+    def iter_expand(self, actions=None):
+        # (action, successor) pairs built one at a time, so a search that cuts off does not build the rest;
+        # the mover, the next player and round are worked out once for all siblings and the actions,
+        # legal ones of this state (all of them by default), are not checked again
         if self.is_goal_state():
             raise Exception(f'ERROR: State is goal!\n{self}')
+        if actions is None:
+            actions = self.get_legal_actions()
+        kind = self.get_on_move_chr()
+        color = kind.lower()
+        n = config.N
+        ships = self.spaceships_positions_dict
+        colors = self.colored_tiles_positions_dict
+        on_move = (self.on_move + 1) % self.num_of_players
+        current_round = self.current_round + (on_move == 0)
+        cls = self.__class__
+        attributes = self.__dict__
+        for action in actions:
+            src, dst = action
+            # shallow copy, the dicts that change are copied
+            child = cls.__new__(cls)
+            child.__dict__.update(attributes)
+            child.spaceships_positions_dict = child_ships = ships.copy()
+            child_ships[kind] = 1 << (dst[0] * n + dst[1])
+            child.colored_tiles_positions_dict = colors.copy()
+            child.legal_actions = {}
+            child.on_move = on_move
+            child.current_round = current_round
+            if src != dst:
+                child.paint(color, self.get_segment(src, dst))
+            yield action, child
+
+    def expand(self, actions=None):
+        return list(self.iter_expand(actions))
 
-        current_spaceship = self.get_on_move_chr()
-        legal_actions = self.get_legal_actions()
-        if action not in legal_actions:
+    def generate_successor_state(self, action):
+        if self.is_goal_state():
+            raise Exception(f'ERROR: State is goal!\n{self}')
+        if action not in self.get_legal_actions():
             raise Exception(f'ERROR: Illegal action {action}!')
-
-        # shallow copy
-        copy_state = copy.copy(self)
-        # deep copy
-        copy_state.spaceships_positions_dict = self.spaceships_positions_dict.copy()
-        copy_state.colored_tiles_positions_dict = self.colored_tiles_positions_dict.copy()
-        copy_state.legal_actions = {}
-
-        src, dst = action
-        src_mask = (1 << (src[0] * config.N + src[1])) & self.all_ones_mask
-        dst_mask = (1 << (dst[0] * config.N + dst[1])) & self.all_ones_mask
-        # clear spaceship from current position
-        copy_state.spaceships_positions_dict[current_spaceship] &= ~src_mask
-        # set spaceship to next position
-        copy_state.spaceships_positions_dict[current_spaceship] |= dst_mask
-
-        # coloring tiles
-        diff_row = dst[0] - src[0]
-        diff_col = dst[1] - src[1]
-        if diff_row:
-            step = 1 if diff_row > 0 else -1
-            for i in range(0, diff_row + step, step):
-                pos = src[0] + i
-                bit = 1 << (pos * config.N + src[1])
-                for key in copy_state.colored_tiles_positions_dict:
-                    if key == current_spaceship.lower():
-                        copy_state.colored_tiles_positions_dict[key] |= bit
-                    else:
-                        copy_state.colored_tiles_positions_dict[key] &= ~bit
-        elif diff_col != 0:
-            step = 1 if diff_col > 0 else -1
-            for i in range(0, diff_col + step, step):
-                pos = src[1] + i
-                bit = 1 << (src[0] * config.N + pos)
-                for key in copy_state.colored_tiles_positions_dict:
-                    if key == current_spaceship.lower():
-                        copy_state.colored_tiles_positions_dict[key] |= bit
-                    else:
-                        copy_state.colored_tiles_positions_dict[key] &= ~bit
-        else:
-            pass
-
-        copy_state.move_to_next_player()
-        return copy_state
+        return next(self.iter_expand([action]))[1]
@@ -0,0 +1,49 @@
+class SearchStats:
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.pruned = 0
+        self.tt_hits = 0
+        self.depth = 0
+        self.movegen_time = 0.0
+        self.successor_time = 0.0
+        self.evaluation_time = 0.0
+        self.total_time = 0.0
+        self.ponder_hit = False
+
+    def reset(self):
+        self.__init__()
+
+    def get_branching_factor(self):
+        return self.nodes ** (1 / self.depth) if self.depth and self.nodes > 1 else 0.0
+
+    def get_pruned_fraction(self):
+        # children skipped by pruning, against all children that would have been generated
+        return self.pruned / (self.nodes + self.pruned) if self.pruned else 0.0
+
+    def get_nodes_per_sec(self):
+        return self.nodes / self.total_time if self.total_time else 0.0
+
+    @staticmethod
+    def format_count(count):
+        if count >= 1_000_000:
+            return f'{count / 1_000_000:.1f}M'
+        if count >= 1_000:
+            return f'{count / 1_000:.1f}k'
+        return str(count)
+
+    def __str__(self):
+        if self.ponder_hit:
+            return f'answered from pondering in {self.total_time:.3f}s'
+        return (f'nodes {self.nodes}, leaves {self.leaves}, cutoffs {self.cutoffs}, '
+                f'pruned {self.get_pruned_fraction() * 100:.1f}%, TT hits {self.tt_hits}, '
+                f'depth {self.depth}, branching factor {self.get_branching_factor():.2f}, '
+                f'{self.get_nodes_per_sec():.0f} nodes/s, '
+                f'time {self.total_time:.3f}s (move generation {self.movegen_time:.3f}s, '
+                f'successors {self.successor_time:.3f}s, evaluation {self.evaluation_time:.3f}s)')
+
+    def short_str(self):
+        if self.ponder_hit:
+            return 'pondered'
+        return f'{self.format_count(self.nodes)}n d{self.depth} bf{self.get_branching_factor():.1f}'
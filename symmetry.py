@@ -0,0 +1,88 @@
+from functools import lru_cache
+from operator import itemgetter
+
+import config
+
+IDENTITY = 0
+# cell transforms of the dihedral group: identity, mirrors, rotation by 180 degrees,
+# and on square maps only the transpositions and rotations by 90 degrees
+TRANSFORMS = [
+    lambda r, c, m, n: (r, c),
+    lambda r, c, m, n: (r, n - 1 - c),
+    lambda r, c, m, n: (m - 1 - r, c),
+    lambda r, c, m, n: (m - 1 - r, n - 1 - c),
+    lambda r, c, m, n: (c, r),
+    lambda r, c, m, n: (c, n - 1 - r),
+    lambda r, c, m, n: (n - 1 - c, r),
+    lambda r, c, m, n: (n - 1 - c, n - 1 - r),
+]
+INVERSES = [0, 1, 2, 3, 4, 6, 5, 7]
+
+
+@lru_cache(maxsize=None)
+def get_permutation(transform, m, n):
+    # target cell of every cell, and a getter that collects the source bit of every target cell
+    targets = [0] * (m * n)
+    for r in range(m):
+        for c in range(n):
+            tr, tc = TRANSFORMS[transform](r, c, m, n)
+            targets[r * n + c] = tr * n + tc
+    sources = [0] * (m * n)
+    for idx, target in enumerate(targets):
+        sources[target] = idx
+    return targets, itemgetter(*sources)
+
+
+def permute_mask(mask, transform, m, n):
+    _, getter = get_permutation(transform, m, n)
+    bits = format(mask, f'0{m * n}b')[::-1]
+    return int(''.join(getter(bits))[::-1], 2)
+
+
+@lru_cache(maxsize=16)
+def get_symmetries(pits, m, n):
+    # transforms that map the pit layout onto itself, the identity first
+    count = len(TRANSFORMS) if m == n else 4
+    return tuple(transform for transform in range(count) if permute_mask(pits, transform, m, n) == pits)
+
+
+def transform_cell(cell, transform):
+    return TRANSFORMS[transform](cell[0], cell[1], config.M, config.N)
+
+
+def transform_action(action, transform):
+    return transform_cell(action[0], transform), transform_cell(action[1], transform)
+
+
+def transform_ships(state, transform):
+    targets, _ = get_permutation(transform, config.M, config.N)
+    return tuple(1 << targets[position.bit_length() - 1] for position in state.spaceships_positions_dict.values())
+
+
+def transform_key(state, transform, ships=None):
+    m, n = config.M, config.N
+    return (ships or transform_ships(state, transform),
+            tuple(permute_mask(color, transform, m, n) for color in state.colored_tiles_positions_dict.values()),
+            state.on_move,
+            state.current_round)
+
+
+def canonical_key(state):
+    # smallest key over the symmetries of the map and the transform that produces it;
+    # an action of state maps to the canonical position with transform_action(action, transform)
+    # and back with transform_action(action, INVERSES[transform])
+    key = state.get_key()
+    symmetries = get_symmetries(state.abyss_tiles_positions_int, config.M, config.N)
+    if len(symmetries) == 1:
+        return key, IDENTITY
+    best_key, best_transform = key, IDENTITY
+    for transform in symmetries[1:]:
+        # keys are compared by spaceships first, the colours only have to be moved on a tie or a win
+        ships = transform_ships(state, transform)
+        if ships > best_key[0]:
+            continue
+        candidate = transform_key(state, transform, ships)
+        if candidate < best_key:
+            best_key, best_transform = candidate, transform
+    return best_key, best_transform
+
@@ -0,0 +1,84 @@
+import time
+
+import config
+from evaluation import get_moves_left
+from util import Timeout
+
+
+def get_final_margin(state, kind):
+    scores = state.get_scores()
+    return scores[kind] - max(score for other, score in scores.items() if other != kind)
+
+
+class Deadline:
+    def __init__(self, soft=None, hard=None):
+        # soft: stop starting new work, hard: the move is forfeited; both in seconds from now, None is unlimited
+        self.start_time = time.time()
+        self.soft = soft
+        self.hard = hard
+
+    def __str__(self):
+        if self.hard is None:
+            return 'unlimited'
+        return f'soft {self.soft:.2f}s, hard {self.hard:.2f}s'
+
+    def get_elapsed(self):
+        return time.time() - self.start_time
+
+    def soft_expired(self):
+        return self.soft is not None and self.get_elapsed() >= self.soft
+
+    def hard_expired(self):
+        # with a margin, so that a search can still return its best move before it is stopped
+        return self.hard is not None and self.get_elapsed() >= self.hard - config.DEADLINE_MARGIN
+
+
+class TimeControl:
+    def __init__(self, num_of_players, max_think_time=0, bank=0, increment=0):
+        self.max_think_time = max_think_time
+        self.increment = increment
+        self.banks = [bank] * num_of_players if bank else None
+
+    def __str__(self):
+        if self.banks is None:
+            return f'{self.max_think_time}s per move' if self.max_think_time else 'unlimited'
+        return ', '.join(f'{chr(ord("A") + i)}: {bank:.2f}s' for i, bank in enumerate(self.banks))
+
+    def uses_bank(self):
+        return self.banks is not None
+
+    def get_forced_action(self, state):
+        # with a bank, the only move besides staying in place (or staying) is played without thinking,
+        # and so is the last move of the game, whose best choice the final scores tell exactly
+        if self.banks is None:
+            return None
+        actions = state.get_legal_actions()
+        if state.get_plies_left() == 1:
+            return max(actions, key=lambda action: get_final_margin(state.generate_successor_state(action),
+                                                                    state.get_on_move_chr()))
+        moving = [action for action in actions if action[0] != action[1]]
+        if len(moving) > 1:
+            return None
+        return moving[0] if moving else actions[0]
+
+    def allocate(self, state):
+        player_ord = state.get_on_move_ord()
+        bank = self.banks[player_ord]
+        moves_left = max(1, get_moves_left(state, player_ord))
+        # positions with more legal moves are more complex and get a bigger share
+        complexity = min(config.MAX_COMPLEXITY, max(config.MIN_COMPLEXITY,
+                                                    len(state.get_legal_actions()) / config.AVERAGE_ACTIONS))
+        soft = min(bank, (bank / moves_left + self.increment) * complexity)
+        hard = min(bank, soft * config.HARD_DEADLINE_FACTOR)
+        return soft, hard
+
+    def start_move(self, state):
+        if self.banks is None:
+            return Deadline(self.max_think_time or None, self.max_think_time or None)
+        if self.banks[state.get_on_move_ord()] <= 0:
+            raise Timeout()
+        return Deadline(*self.allocate(state))
+
+    def end_move(self, player_ord, elapsed):
+        if self.banks is not None:
+            self.banks[player_ord] += self.increment - elapsed
@@ -0,0 +1,166 @@
+import argparse
+import glob
+import os
+import random
+import time
+
+import numpy as np
+
+import config
+import evaluation
+from agents import create_agents
+from map_loader import parse_map, read_map_lines
+from mapgen import generate_map, map_name
+from match import play_opening
+
+FITS = ['lstsq', 'logistic']
+
+
+def get_maps(max_area, random_maps, seed):
+    # (name, lines) of the committed maps up to max_area, and of freshly generated small ones
+    maps = []
+    for path in sorted(glob.glob(os.path.join(config.MAP_FOLDER, '**', '*.txt'), recursive=True)):
+        lines = list(read_map_lines(path))
+        if len(lines) * len(lines[0]) <= max_area:
+            maps.append((os.path.relpath(path, config.MAP_FOLDER), lines))
+    rng = random.Random(seed)
+    for _ in range(random_maps):
+        width, height = rng.randint(5, 12), rng.randint(5, 12)
+        num_of_players, pit_ratio, map_seed = rng.choice([2, 2, 4]), rng.uniform(0.1, 0.3), rng.randrange(1 << 30)
+        maps.append((map_name(width, height, pit_ratio, num_of_players, map_seed),
+                     generate_map(width, height, pit_ratio, num_of_players, map_seed)))
+    return maps
+
+
+def create_player(state, weights):
+    agent = create_agents(['NegamaxABAgent' if state.get_num_of_players() == 2 else 'MaxNAgent'], 1)[0]
+    agent.weights = weights
+    return agent
+
+
+def play_game(lines, max_rounds, weights, depth, epsilon, rng):
+    # searched moves on the current weights, random with probability epsilon for varied positions
+    state = parse_map(lines, max_rounds)
+    agent = create_player(state, weights)
+    positions = []
+    while not state.is_goal_state():
+        positions.append(evaluation.get_features(state))
+        action = rng.choice(state.get_legal_actions()) if rng.random() < epsilon else agent.choose(state, depth)
+        state = state.generate_successor_state(action)
+    return positions, state.get_scores()
+
+
+def collect(maps, games, max_rounds, weights, depth, epsilon, seed):
+    # one row per position and pair of ships: their feature difference and final score margin
+    rng = random.Random(seed)
+    rows, margins = [], []
+    for name, lines in maps:
+        start_time = time.perf_counter()
+        for _ in range(games):
+            positions, scores = play_game(lines, max_rounds, weights, depth, epsilon, rng)
+            for features in positions:
+                kinds = list(features)
+                for i, kind in enumerate(kinds):
+                    for other in kinds[i + 1:]:
+                        rows.append([a - b for a, b in zip(features[kind], features[other])])
+                        margins.append(scores[kind] - scores[other])
+        print(f'{name}: {games} games in {time.perf_counter() - start_time:.1f}s')
+    return np.array(rows, dtype=float), np.array(margins, dtype=float)
+
+
+def normalize(weights):
+    # only the ranking of moves changes with the scale, the searches work in tiles (bounds, margins)
+    if weights[0] <= 0:
+        raise Exception(f'Fitted tile weight {weights[0]:.3f} is not positive!')
+    return weights / weights[0]
+
+
+def fit_least_squares(rows, margins):
+    # no intercept: swapping the ships negates both sides
+    weights, *_ = np.linalg.lstsq(rows, margins, rcond=None)
+    return normalize(weights)
+
+
+def fit_logistic(rows, margins, iterations=25, l2=1e-3):
+    # probability that the first ship finishes ahead, fitted with Newton steps; draws are left out
+    decided = margins != 0
+    x, y = rows[decided], (margins[decided] > 0).astype(float)
+    weights = np.zeros(x.shape[1])
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-x @ weights))
+        gradient = x.T @ (p - y) + l2 * weights
+        hessian = (x.T * (p * (1 - p))) @ x + l2 * np.eye(x.shape[1])
+        weights -= np.linalg.solve(hessian, gradient)
+    return normalize(weights)
+
+
+def get_accuracy(rows, margins, weights):
+    decided = margins != 0
+    return float(np.mean(np.sign(rows[decided] @ weights) == np.sign(margins[decided])))
+
+
+def validate(maps, weights, depth, default_depth, openings, max_rounds, opening_plies):
+    # the tuned evaluation against the default one, usually searching a ply deeper, from both seats
+    wins = draws = losses = 0
+    for name, lines in maps:
+        if parse_map(lines, max_rounds).get_num_of_players() != 2:
+            continue
+        for seed in range(openings):
+            for tuned_ord in range(2):
+                agents = create_agents(['NegamaxABAgent'], 2)
+                agents[tuned_ord].weights = weights
+                agents[1 - tuned_ord].weights = evaluation.DEFAULT_WEIGHTS
+                depths = [default_depth, default_depth]
+                depths[tuned_ord] = depth
+                state = play_opening(parse_map(lines, max_rounds), opening_plies, seed)
+                while not state.is_goal_state():
+                    ord_on_move = state.get_on_move_ord()
+                    state = state.generate_successor_state(agents[ord_on_move].choose(state, depths[ord_on_move]))
+                scores = state.get_scores()
+                margin = scores[chr(ord('A') + tuned_ord)] - scores[chr(ord('A') + 1 - tuned_ord)]
+                wins += margin > 0
+                draws += margin == 0
+                losses += margin < 0
+    print(f'tuned at depth {depth} against default at depth {default_depth}: {wins} wins, {draws} draws, {losses} losses')
+    return wins, draws, losses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit evaluation weights from self-play games.')
+    parser.add_argument('--games', type=int, default=10, help='games per map')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--max-area', type=int, default=256, help='largest committed map to play on')
+    parser.add_argument('--random-maps', type=int, default=10, help='small generated maps added to the committed ones')
+    parser.add_argument('--play-depth', type=int, default=3, help='search depth of the self-play games')
+    parser.add_argument('--epsilon', type=float, default=0.15, help='share of random moves')
+    parser.add_argument('--fit', choices=FITS, default='lstsq')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=config.WEIGHTS_FILE)
+    parser.add_argument('--validate', type=int, default=0, help='openings per two-player map to check the result on')
+    parser.add_argument('--depth', type=int, default=2, help='search depth of the tuned side when validating')
+    parser.add_argument('--default-depth', type=int, help='search depth of the default side, one more by default')
+    args = parser.parse_args()
+
+    training_maps = get_maps(args.max_area, args.random_maps, args.seed)
+    x, margins = collect(training_maps, args.games, args.rounds, evaluation.DEFAULT_WEIGHTS, args.play_depth,
+                         args.epsilon, args.seed)
+    fitted = tuple(float(weight) for weight in
+                   (fit_least_squares(x, margins) if args.fit == 'lstsq' else fit_logistic(x, margins)))
+    accuracy = get_accuracy(x, margins, np.array(fitted))
+    default_accuracy = get_accuracy(x, margins, np.array(evaluation.DEFAULT_WEIGHTS))
+    print(f'{len(x)} samples, weights {dict(zip(evaluation.FEATURES, np.round(fitted, 4).tolist()))}, '
+          f'winner predicted {accuracy * 100:.1f}% (default weights {default_accuracy * 100:.1f}%)')
+    metadata = {'fit': args.fit, 'maps': [name for name, _ in training_maps], 'games_per_map': args.games,
+                'rounds': args.rounds, 'play_depth': args.play_depth, 'epsilon': args.epsilon, 'seed': args.seed,
+                'samples': len(x), 'accuracy': round(accuracy, 4), 'created': time.strftime('%Y-%m-%d %H:%M:%S')}
+    if args.validate:
+        default_depth = args.default_depth or args.depth + 1
+        results = validate(training_maps, fitted, args.depth, default_depth, args.validate, args.rounds, 2)
+        # the goal: more wins than losses against the default weights searching deeper
+        passed = default_depth > args.depth and results[0] > results[2]
+        metadata['validation'] = {'depth': args.depth, 'default_depth': default_depth,
+                                  **dict(zip(['wins', 'draws', 'losses'], results)), 'passed': passed}
+        print('validation passed, set TUNED_WEIGHTS in config.py to evaluate with them' if passed else
+              'validation failed, keep the default weights')
+    evaluation.save_weights(args.output, fitted, **metadata)
+    print(f'weights saved to {args.output}')
@@ -1,8 +1,13 @@
+import cProfile
 import ctypes
+import io
 import os
+import pstats
+import sys
 import time
+from collections import Counter
 from datetime import datetime
-from threading import Timer, Thread
+from threading import Timer, Thread, Event, get_ident
 
 import config
 
@@ -11,6 +16,10 @@ class Timeout(Exception):
     pass
 
 
+def popcount(mask):
+    return mask.bit_count() if hasattr(mask, 'bit_count') else bin(mask).count('1')
+
+
 def send_thread_exception(*args):
     for t_id in args:
         res = ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(t_id), ctypes.py_object(Timeout))
@@ -56,10 +65,11 @@ class TimedFunction(Thread):
 
 
 class Logger:
-    def __init__(self):
+    def __init__(self, prefix='LOG'):
         if not os.path.exists(config.LOG_FOLDER):
             os.mkdir(config.LOG_FOLDER)
-        self.lg = open(os.path.join(config.LOG_FOLDER, f'LOG_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.txt'), 'w')
+        self.lg = open(os.path.join(config.LOG_FOLDER,
+                                    f'{prefix}_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.txt'), 'w')
 
     def close(self):
         self.lg.close()
@@ -74,3 +84,68 @@ class Logger:
 
     def log_error(self, message, to_std_out=False):
         self.log(message, 'ERROR', to_std_out)
+
+
+class SamplingProfiler(Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stopped = Event()
+        self.stacks = Counter()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if self.stopped.is_set():
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def dump(self, path):
+        # collapsed stacks, readable by flamegraph tools
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{";".join(stack)} {count}\n')
+
+    def report(self, top):
+        total = sum(self.stacks.values())
+        self_counts = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+        lines = [f'{total} samples every {self.interval * 1000:.1f}ms, top functions by self time:']
+        for function, count in self_counts.most_common(top):
+            lines.append(f'{count / total * 100:6.2f}%  {function}')
+        return '\n'.join(lines)
+
+
+def profile_call(profiler_kind, logger, method, *args):
+    path = os.path.join(config.LOG_FOLDER, f'PROFILE_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f")}')
+    if profiler_kind == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(method, *args)
+        finally:
+            profiler.dump_stats(f'{path}.prof')
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(config.PROFILE_TOP)
+            logger.log_info(f'Profile saved to {path}.prof\n{stream.getvalue()}')
+    elif profiler_kind == 'sample':
+        profiler = SamplingProfiler(get_ident(), config.PROFILE_SAMPLE_INTERVAL)
+        profiler.start()
+        try:
+            return method(*args)
+        finally:
+            profiler.stop()
+            profiler.dump(f'{path}.folded')
+            logger.log_info(f'Profile saved to {path}.folded\n{profiler.report(config.PROFILE_TOP)}')
+    raise ValueError(f'ERROR: No such profiler: {profiler_kind}')
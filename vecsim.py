@@ -0,0 +1,228 @@
+import argparse
+import time
+
+import numpy as np
+
+import config
+from agents import get_seat_names
+from map_loader import load_state
+
+POLICIES = ['random', 'greedy']
+# slide directions in the order of State.get_legal_actions: up, right, down, left
+NUM_OF_DIRECTIONS = 4
+MAX_ACTIONS = 2 * NUM_OF_DIRECTIONS + 1
+MASK64 = (1 << 64) - 1
+MIX_CONSTANTS = [0x9E3779B97F4A7C15, 0xBF58476D1CE4E5B9, 0x94D049BB133111EB]
+
+
+def mix(seed, game, ply):
+    # counter based random number (splitmix64), the same for a game however many are played at once
+    z = (seed * MIX_CONSTANTS[0] + game * MIX_CONSTANTS[1] + ply * MIX_CONSTANTS[2]) & MASK64
+    z = ((z ^ (z >> 30)) * MIX_CONSTANTS[1]) & MASK64
+    z = ((z ^ (z >> 27)) * MIX_CONSTANTS[2]) & MASK64
+    return z ^ (z >> 31)
+
+
+def mix_array(seed, games, ply):
+    c1, c2 = np.uint64(MIX_CONSTANTS[1]), np.uint64(MIX_CONSTANTS[2])
+    z = np.uint64(seed * MIX_CONSTANTS[0] + ply * MIX_CONSTANTS[2] & MASK64) + games.astype(np.uint64) * c1
+    z = (z ^ (z >> np.uint64(30))) * c1
+    z = (z ^ (z >> np.uint64(27))) * c2
+    return z ^ (z >> np.uint64(31))
+
+
+def mask_to_array(mask, size):
+    return np.frombuffer(format(mask, f'0{size}b')[::-1].encode(), dtype=np.uint8) == ord('1')
+
+
+def choose_scalar_action(state, policy, seed, game, ply):
+    actions = state.get_legal_actions()
+    if policy == 'greedy':
+        kind = state.get_on_move_chr()
+        scores = [state.generate_successor_state(action).get_score(kind) for action in actions]
+        return actions[scores.index(max(scores))]
+    return actions[mix(seed, game, ply) % len(actions)]
+
+
+def play_scalar(state, policies, seed, game):
+    # reference game on State, the vectorized engine has to reach the same final position
+    ply = 0
+    while not state.is_goal_state():
+        state = state.generate_successor_state(
+            choose_scalar_action(state, policies[state.get_on_move_ord()], seed, game, ply))
+        ply += 1
+    return state
+
+
+class VectorGames:
+    def __init__(self, state, num_of_games, first_game=0):
+        m, n = config.M, config.N
+        self.num_of_games = num_of_games
+        self.games = np.arange(first_game, first_game + num_of_games)
+        self.num_of_players = state.get_num_of_players()
+        self.max_rounds = state.get_max_rounds()
+        self.current_round = state.get_current_round()
+        self.on_move = state.get_on_move_ord()
+        self.ply = 0
+
+        # every cell is -1 (pit), 0 (free) or 1 + index of its colour in kinds
+        self.kinds = list(state.colored_tiles_positions_dict)
+        pits = mask_to_array(state.get_state('0'), m * n)
+        owner = np.where(pits, -1, 0).astype(np.int8)
+        for code, kind in enumerate(self.kinds, 1):
+            owner[mask_to_array(state.colored_tiles_positions_dict[kind], m * n)] = code
+        self.owner = np.tile(owner, (num_of_games, 1))
+        self.codes = np.array([self.kinds.index(kind.lower()) + 1 for kind in state.spaceships_positions_dict])
+        self.ships = np.tile([position.bit_length() - 1 for position in state.spaceships_positions_dict.values()],
+                             (num_of_games, 1))
+        self.scores = np.tile([state.get_score(kind) for kind in self.kinds], (num_of_games, 1))
+        self.free = np.full(num_of_games, state.get_free_count())
+        self.done = np.full(num_of_games, state.is_goal_state())
+
+        # static slide lengths from every cell until a pit or the edge, other spaceships are added per move
+        grid = pits.reshape(m, n)
+        rays = np.zeros((NUM_OF_DIRECTIONS, m, n), dtype=np.int64)
+        for i in range(1, m):
+            rays[0, i] = np.where(grid[i - 1], 0, rays[0, i - 1] + 1)
+            rays[2, m - 1 - i] = np.where(grid[m - i], 0, rays[2, m - i] + 1)
+        for j in range(1, n):
+            rays[3, :, j] = np.where(grid[:, j - 1], 0, rays[3, :, j - 1] + 1)
+            rays[1, :, n - 1 - j] = np.where(grid[:, n - j], 0, rays[1, :, n - j] + 1)
+        self.rays = rays.reshape(NUM_OF_DIRECTIONS, m * n)
+        self.steps = np.array([-n, 1, n, -1])
+
+    def get_slide_lengths(self):
+        n = config.N
+        position = self.ships[:, self.on_move]
+        row, col = position // n, position % n
+        lengths = self.rays[:, position].T.copy()
+        for other in range(self.num_of_players):
+            if other == self.on_move:
+                continue
+            other_row, other_col = self.ships[:, other] // n, self.ships[:, other] % n
+            same_col, same_row = other_col == col, other_row == row
+            blocked = np.stack([np.where(same_col & (other_row < row), row - other_row - 1, lengths[:, 0]),
+                                np.where(same_row & (other_col > col), other_col - col - 1, lengths[:, 1]),
+                                np.where(same_col & (other_row > row), other_row - row - 1, lengths[:, 2]),
+                                np.where(same_row & (other_col < col), col - other_col - 1, lengths[:, 3])], axis=1)
+            lengths = np.minimum(lengths, blocked)
+        return lengths
+
+    def get_legal_actions(self):
+        # columns: the four slides, the four one tile moves and staying, valid ones in State order
+        lengths = self.get_slide_lengths()
+        valid = np.ones((self.num_of_games, MAX_ACTIONS), dtype=bool)
+        valid[:, :NUM_OF_DIRECTIONS] = lengths > 0
+        valid[:, NUM_OF_DIRECTIONS:2 * NUM_OF_DIRECTIONS] = lengths > 1
+        move_lengths = np.zeros((self.num_of_games, MAX_ACTIONS), dtype=np.int64)
+        move_lengths[:, :NUM_OF_DIRECTIONS] = lengths
+        move_lengths[:, NUM_OF_DIRECTIONS:2 * NUM_OF_DIRECTIONS] = 1
+        return valid, move_lengths
+
+    def get_gains(self, move_lengths):
+        # tiles the mover would gain with every action
+        code = self.codes[self.on_move]
+        position = self.ships[:, self.on_move]
+        gains = np.zeros((self.num_of_games, MAX_ACTIONS), dtype=np.int64)
+        for direction in range(NUM_OF_DIRECTIONS):
+            length = move_lengths[:, direction]
+            max_length = length.max()
+            if not max_length:
+                continue
+            offsets = np.arange(1, max_length + 1)
+            inside = offsets <= length[:, None]
+            cells = np.where(inside, position[:, None] + self.steps[direction] * offsets, 0)
+            new = np.cumsum(inside & (np.take_along_axis(self.owner, cells, axis=1) != code), axis=1)
+            gains[:, direction] = new[:, -1]
+            gains[:, NUM_OF_DIRECTIONS + direction] = new[:, 0]
+        return gains
+
+    def choose(self, policy, seed):
+        valid, move_lengths = self.get_legal_actions()
+        if policy == 'greedy':
+            # first action with the highest gain, as GreedyAgent
+            return np.argmax(np.where(valid, self.get_gains(move_lengths), -1), axis=1), move_lengths
+        picks = mix_array(seed, self.games, self.ply) % valid.sum(axis=1).astype(np.uint64)
+        order = np.cumsum(valid, axis=1) - 1
+        return np.argmax(valid & (order == picks[:, None].astype(np.int64)), axis=1), move_lengths
+
+    def step(self, policies, seed):
+        columns, move_lengths = self.choose(policies[self.on_move], seed)
+        active = ~self.done
+        code = self.codes[self.on_move]
+        position = self.ships[:, self.on_move]
+        length = np.where(active, move_lengths[np.arange(self.num_of_games), columns], 0)
+        step = self.steps[columns % NUM_OF_DIRECTIONS]
+
+        if (max_length := length.max()) > 0:
+            offsets = np.arange(1, max_length + 1)
+            inside = offsets <= length[:, None]
+            cells = np.where(inside, position[:, None] + step[:, None] * offsets, 0)
+            previous = np.take_along_axis(self.owner, cells, axis=1)
+            gained = inside & (previous != code)
+            self.scores[:, code - 1] += gained.sum(axis=1)
+            stolen_games, stolen_cells = np.nonzero(gained & (previous > 0))
+            np.subtract.at(self.scores, (stolen_games, previous[stolen_games, stolen_cells] - 1), 1)
+            self.free -= (gained & (previous == 0)).sum(axis=1)
+            gained_games, gained_cells = np.nonzero(gained)
+            self.owner[gained_games, cells[gained_games, gained_cells]] = code
+            self.ships[:, self.on_move] = position + step * length
+
+        self.ply += 1
+        self.on_move = (self.on_move + 1) % self.num_of_players
+        if self.on_move == 0:
+            self.current_round += 1
+        self.done |= (self.free == 0) | (self.current_round == self.max_rounds)
+
+    def run(self, policies, seed):
+        while not self.done.all():
+            self.step(policies, seed)
+        return self.scores
+
+    def get_scores(self, game):
+        return {kind.upper(): int(score) for kind, score in zip(self.kinds, self.scores[game])}
+
+
+def verify(map_name, max_rounds, policies, seed, vector_games, num_of_games):
+    # replays the first games on State and compares final scores and spaceship positions
+    mismatches = []
+    for game in range(min(num_of_games, vector_games.num_of_games)):
+        state = play_scalar(load_state(map_name, max_rounds), policies, seed, int(vector_games.games[game]))
+        positions = [position.bit_length() - 1 for position in state.spaceships_positions_dict.values()]
+        if state.get_scores() != vector_games.get_scores(game) or positions != list(vector_games.ships[game]):
+            mismatches.append(game)
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play many games of one map at once with NumPy.')
+    parser.add_argument('map', nargs='?', default='example_map.txt')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--policies', default='random', help=f'comma separated, per spaceship: {POLICIES}')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verify', type=int, default=0, help='replay this many games on State and compare')
+    args = parser.parse_args()
+
+    initial_state = load_state(args.map, args.rounds)
+    seat_policies = get_seat_names(args.policies.split(','), initial_state.get_num_of_players())
+    if unknown := set(seat_policies) - set(POLICIES):
+        parser.error(f'unknown policy {unknown.pop()}')
+    start_time = time.perf_counter()
+    games = VectorGames(initial_state, args.games)
+    final_scores = games.run(seat_policies, args.seed)
+    elapsed = time.perf_counter() - start_time
+
+    print(f'{args.games} games, {games.ply} plies in {elapsed:.2f}s '
+          f'({args.games / elapsed:.0f} games/s, {args.games * games.ply / elapsed:.0f} plies/s)')
+    # a game is won only by a single highest score
+    best = final_scores.max(axis=1, keepdims=True)
+    winners = np.where((final_scores == best).sum(axis=1) == 1, np.argmax(final_scores, axis=1), -1)
+    for index, kind in enumerate(games.kinds):
+        print(f'{kind.upper()}: mean score {final_scores[:, index].mean():.2f}, '
+              f'wins {np.mean(winners == index) * 100:.1f}%')
+    print(f'draws {np.mean(winners == -1) * 100:.1f}%')
+    if args.verify:
+        failed = verify(args.map, args.rounds, seat_policies, args.seed, games, args.verify)
+        print(f'verified {min(args.verify, args.games)} games against State: '
+              f'{"all equal" if not failed else f"mismatches in games {failed}"}')
@@ -0,0 +1,151 @@
+import pygame
+
+import config
+from sprites import AbyssTile, Atlas, Spaceship
+
+# map from '0'/'1' characters of a row to palette index of a layer
+LAYER_TABLES = [bytes.maketrans(b'01', bytes([0, code])) for code in range(1, 2 + len(Spaceship.kinds()))]
+
+
+class Viewport:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.tile_size = config.TILE_SIZE
+        self.x = 0
+        self.y = 0
+        self.surface = pygame.Surface((width, height))
+        self.surface_key = None
+
+    def get_image(self, image_name):
+        return Atlas.get((self.tile_size, self.tile_size)).images[image_name]
+
+    @staticmethod
+    def abyss_image_name(idx):
+        # fixed pseudo-random variant per tile so the board does not flicker while scrolling
+        return f'abysstile{(idx * 2654435761 >> 7) % AbyssTile.DIFFERENT_ABYSS_TYPES}.png'
+
+    def clamp(self):
+        self.x = max(0, min(self.x, config.N * self.tile_size - self.width))
+        self.y = max(0, min(self.y, config.M * self.tile_size - self.height))
+
+    def scroll(self, d_rows, d_cols):
+        self.x += d_cols * self.tile_size
+        self.y += d_rows * self.tile_size
+        self.clamp()
+
+    def zoom(self, factor, center=None):
+        cx, cy = center if center else (self.width // 2, self.height // 2)
+        new_tile_size = int(min(config.MAX_TILE_SIZE, max(config.VIEWPORT_MIN_TILE_SIZE, self.tile_size * factor)))
+        if new_tile_size == self.tile_size:
+            return
+        # keep the world point under center fixed
+        self.x = (self.x + cx) * new_tile_size // self.tile_size - cx
+        self.y = (self.y + cy) * new_tile_size // self.tile_size - cy
+        self.tile_size = new_tile_size
+        self.clamp()
+
+    def center_on(self, position):
+        self.x = position[1] * self.tile_size - self.width // 2
+        self.y = position[0] * self.tile_size - self.height // 2
+        self.clamp()
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEWHEEL:
+            self.zoom(2 if event.y > 0 else 0.5, pygame.mouse.get_pos())
+        elif event.type == pygame.KEYDOWN:
+            if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                self.zoom(2)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.zoom(0.5)
+            elif event.key == pygame.K_UP:
+                self.scroll(-config.VIEWPORT_SCROLL_TILES, 0)
+            elif event.key == pygame.K_DOWN:
+                self.scroll(config.VIEWPORT_SCROLL_TILES, 0)
+            elif event.key == pygame.K_LEFT:
+                self.scroll(0, -config.VIEWPORT_SCROLL_TILES)
+            elif event.key == pygame.K_RIGHT:
+                self.scroll(0, config.VIEWPORT_SCROLL_TILES)
+
+    def visible_range(self):
+        ts = self.tile_size
+        first_row, first_col = self.y // ts, self.x // ts
+        last_row = min(config.M, (self.y + self.height) // ts + 1)
+        last_col = min(config.N, (self.x + self.width) // ts + 1)
+        return first_row, first_col, last_row, last_col
+
+    def render_cells(self, state, trail, trail_kind):
+        # zoomed out: one palette pixel per visible cell, scaled up in one call
+        ts = self.tile_size
+        first_row, first_col, last_row, last_col = self.visible_range()
+        num_of_cols = last_col - first_col
+        cols_mask = (1 << num_of_cols) - 1
+        kinds = list(state.colored_tiles_positions_dict)
+        layers = [state.get_state('0')] + [state.colored_tiles_positions_dict[kind] for kind in kinds]
+
+        rows = []
+        for i in range(first_row, last_row):
+            shift = i * config.N + first_col
+            row = 0
+            for layer, table in zip(layers, LAYER_TABLES):
+                bits = format((layer >> shift) & cols_mask, f'0{num_of_cols}b')[::-1]
+                row |= int.from_bytes(bits.encode().translate(table), 'big')
+            rows.append(row.to_bytes(num_of_cols, 'big'))
+        cells = pygame.image.frombuffer(b''.join(rows), (num_of_cols, last_row - first_row), 'P')
+        cells.set_palette([config.WHITE, config.BLACK] + [Spaceship.colors()[kind.upper()] for kind in kinds])
+        for i, j in trail:
+            if first_row <= i < last_row and first_col <= j < last_col:
+                cells.set_at((j - first_col, i - first_row), kinds.index(trail_kind) + 2)
+
+        self.surface.fill(config.WHITE)
+        self.surface.blit(pygame.transform.scale(cells, (num_of_cols * ts, (last_row - first_row) * ts)),
+                          (first_col * ts - self.x, first_row * ts - self.y))
+
+    def render_tiles(self, state, trail, trail_kind):
+        ts = self.tile_size
+        first_row, first_col, last_row, last_col = self.visible_range()
+        num_of_cols = last_col - first_col
+        cols_mask = (1 << num_of_cols) - 1
+
+        self.surface.fill(config.WHITE)
+        free_image = self.get_image('freetile.png')
+        layers = [(state.get_state('0'), None)]
+        layers += [(color, self.get_image(f'coloredtile_{kind}.png'))
+                   for kind, color in state.colored_tiles_positions_dict.items()]
+
+        blits = []
+        for i in range(first_row, last_row):
+            py = i * ts - self.y
+            blits.extend((free_image, (j * ts - self.x, py)) for j in range(first_col, last_col))
+            shift = i * config.N + first_col
+            for layer, image in layers:
+                bits = (layer >> shift) & cols_mask
+                while bits:
+                    low = bits & -bits
+                    j = low.bit_length() - 1
+                    bits ^= low
+                    tile_image = image or self.get_image(self.abyss_image_name(shift + j))
+                    blits.append((tile_image, ((first_col + j) * ts - self.x, py)))
+        if trail:
+            trail_image = self.get_image(f'coloredtile_{trail_kind}.png')
+            blits.extend((trail_image, (j * ts - self.x, i * ts - self.y)) for i, j in trail
+                         if first_row <= i < last_row and first_col <= j < last_col)
+        self.surface.blits(blits, doreturn=False)
+
+    def draw(self, screen, state, spaceships, trail=(), trail_kind=None):
+        # tiles change only after a move or a view change, so the rendered surface is reused between frames
+        key = (id(state), self.x, self.y, self.tile_size, len(trail))
+        if key != self.surface_key:
+            if self.tile_size < config.MIN_TILE_SIZE:
+                self.render_cells(state, trail, trail_kind)
+            else:
+                self.render_tiles(state, trail, trail_kind)
+            self.surface_key = key
+        screen.blit(self.surface, (0, 0))
+
+        ts = self.tile_size
+        for spaceship in spaceships:
+            px = spaceship.rect.x * ts // config.TILE_SIZE - self.x
+            py = spaceship.rect.y * ts // config.TILE_SIZE - self.y
+            if -ts < px < self.width and -ts < py < self.height:
+                screen.blit(self.get_image(f'spaceship_{spaceship.my_kind().lower()}.png'), (px, py))
@@ -0,0 +1,235 @@
+"""
+AGENT WORKER PROTOCOL
+Agents can run in long-lived processes that talk to the game over their
+standard input and output, one command per line (similar to UCI).
+
+game -> worker                                   worker -> game
+pynther                                          id name <name>
+                                                 pyntherok
+isready                                          readyok
+newgame
+sharedtt <name>
+position <max_rounds> <round> <on_move> <rows>
+state <hex>
+go depth <d> [soft <seconds> hard <seconds>]     info <field> <value> ...
+                                                 bestmove <row> <col> <row> <col>
+quit
+
+<rows> are the lines of the map separated by '/', with the characters of map
+files ('_' free, '0' pit, 'a'-'d' colour, 'A'-'D' spaceship, which always
+stands on its own colour). <on_move> is the index of the spaceship on move
+(0 is A) and <round> counts from 0. The deadlines are relative to the moment
+'go' is sent; a worker that has not answered by the hard one is killed.
+'state' is a later position of the same map as the last 'position', as the
+hex of State.to_bytes (see state.py); only Python workers are sent it.
+'sharedtt' attaches the agent to a shared transposition table (sharedtt.py)
+of the same map. Info fields are those of SearchStats, unknown ones are
+ignored. Any program that speaks this protocol can take a seat as
+'ext:<command>'.
+
+"""
+import os
+import shlex
+import subprocess
+import sys
+import time
+from queue import Queue, Empty
+from threading import Thread
+
+import config
+from agents import create_agents, get_seat_names
+from map_loader import parse_map
+from state import State
+from stats import SearchStats
+from timecontrol import Deadline
+from util import Timeout
+
+EXTERNAL_PREFIX = 'ext:'
+STATS_FIELDS = ['nodes', 'leaves', 'cutoffs', 'pruned', 'tt_hits', 'depth',
+                'movegen_time', 'successor_time', 'evaluation_time', 'total_time']
+
+
+def format_position(state):
+    return (f'position {state.get_max_rounds()} {state.get_current_round()} {state.get_on_move_ord()} '
+            f'{"/".join(state.get_map_lines())}')
+
+
+def parse_position(args):
+    max_rounds, current_round, on_move, rows = args
+    state = parse_map(rows.split('/'), int(max_rounds))
+    state.current_round = int(current_round)
+    state.on_move = int(on_move)
+    return state
+
+
+def format_action(action):
+    (src_row, src_col), (dst_row, dst_col) = action
+    return f'{src_row} {src_col} {dst_row} {dst_col}'
+
+
+def parse_action(args):
+    src_row, src_col, dst_row, dst_col = map(int, args[:4])
+    return (src_row, src_col), (dst_row, dst_col)
+
+
+def format_stats(stats):
+    return ' '.join(f'{field} {getattr(stats, field)}' for field in STATS_FIELDS)
+
+
+def parse_stats(args, stats):
+    for field, value in zip(args[::2], args[1::2]):
+        if field in STATS_FIELDS:
+            setattr(stats, field, type(getattr(stats, field))(float(value)))
+
+
+class AgentWorker:
+    def __init__(self, command, name, binary=False):
+        self.command = command
+        self.name = name
+        self.binary = binary
+        self.map_id = None
+        self.stats = SearchStats()
+        self.ponderer = None
+        self.process = None
+        self.lines = None
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+        self.lines = Queue()
+        self.map_id = None
+        Thread(target=self.read_lines, args=(self.process.stdout, self.lines), daemon=True).start()
+        self.send('pynther')
+        self.read_until('pyntherok', time.time() + config.WORKER_START_TIMEOUT)
+
+    @staticmethod
+    def read_lines(stream, lines):
+        for line in stream:
+            lines.put(line.split())
+        lines.put(None)
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def send(self, command):
+        try:
+            self.process.stdin.write(command + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            raise Exception(f'Worker {self.name} exited!')
+
+    def read_until(self, keyword, end_time=None):
+        while True:
+            try:
+                words = self.lines.get(timeout=max(0.0, end_time - time.time()) if end_time else None)
+            except Empty:
+                self.kill()
+                raise Timeout()
+            if words is None:
+                raise Exception(f'Worker {self.name} exited!')
+            if words and words[0] == 'info':
+                parse_stats(words[1:], self.stats)
+            elif words and words[0] == keyword:
+                return words[1:]
+
+    def choose(self, state, max_depth, deadline=None):
+        self.stats.reset()
+        command = f'go depth {max_depth}'
+        end_time = None
+        if deadline and deadline.hard is not None:
+            elapsed = deadline.get_elapsed()
+            command += f' soft {deadline.soft - elapsed:.3f} hard {deadline.hard - elapsed:.3f}'
+            # the caller's own timer fires first, the grace only matters without one
+            end_time = deadline.start_time + deadline.hard + config.WORKER_KILL_GRACE
+        try:
+            descriptor = state.get_descriptor()
+            if self.binary and descriptor.map_id == self.map_id:
+                self.send(f'state {state.to_bytes(descriptor).hex()}')
+            else:
+                self.send(format_position(state))
+                self.map_id = descriptor.map_id
+            self.send(command)
+            return parse_action(self.read_until('bestmove', end_time))
+        except Timeout:
+            self.kill()
+            raise
+
+    def attach_shared_table(self, name):
+        self.send(f'sharedtt {name}')
+
+    def kill(self):
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
+
+    def new_game(self):
+        self.stats.reset()
+        if self.is_alive():
+            self.send('newgame')
+        else:
+            self.start()
+
+    def close(self):
+        if self.is_alive():
+            try:
+                self.send('quit')
+                self.process.wait(timeout=config.WORKER_KILL_GRACE)
+            except (Exception, subprocess.TimeoutExpired):
+                self.kill()
+
+
+def create_seats(algorithms_names, num_of_players):
+    # in-process agents, python workers (config.WORKERS) or external programs, one per spaceship
+    seats = []
+    for name in get_seat_names(algorithms_names, num_of_players):
+        if name.startswith(EXTERNAL_PREFIX):
+            seats.append(AgentWorker(shlex.split(name[len(EXTERNAL_PREFIX):]), name))
+        elif config.WORKERS:
+            seats.append(AgentWorker([sys.executable, os.path.abspath(__file__), name], name, binary=True))
+        else:
+            seats.extend(create_agents([name], 1))
+    return seats
+
+
+def reply(line):
+    sys.stdout.write(line + '\n')
+    sys.stdout.flush()
+
+
+def run_worker(agent_name):
+    agent = create_agents([agent_name], 1)[0]
+    state = None
+    for line in sys.stdin:
+        words = line.split()
+        if not words:
+            continue
+        command, args = words[0], words[1:]
+        if command == 'pynther':
+            reply(f'id name {agent_name}')
+            reply('pyntherok')
+        elif command == 'isready':
+            reply('readyok')
+        elif command == 'newgame':
+            agent.new_game()
+        elif command == 'sharedtt':
+            agent.attach_shared_table(args[0])
+        elif command == 'position':
+            state = parse_position(args)
+            # later positions of this map may come as binary records
+            state.get_descriptor()
+        elif command == 'state':
+            state = State.from_bytes(bytes.fromhex(args[0]))
+        elif command == 'go':
+            options = dict(zip(args[::2], args[1::2]))
+            deadline = Deadline(float(options['soft']), float(options['hard'])) if 'hard' in options else None
+            action = agent.choose(state, int(options.get('depth', 1)), deadline)
+            reply(f'info {format_stats(agent.stats)}')
+            reply(f'bestmove {format_action(action)}')
+        elif command == 'quit':
+            break
+    agent.close()
+
+
+if __name__ == '__main__':
+    run_worker(sys.argv[1] if len(sys.argv) > 1 else 'RandomAgent')